@@ -13,7 +13,6 @@ and args_). The first is less magic and also recommended.
 """
 
 # TODO
-# - add a help command, not just -h
 # - add colorize function
 # - add logging
 # - beatify errors
@@ -22,14 +21,25 @@ and args_). The first is less magic and also recommended.
 
 import argparse
 import atexit
+import collections
+import cStringIO
+import difflib
 import functools
 import os
 import re
 import readline
 import sys
+import threading
+import time
 import traceback
 
-from argcmd import trie
+from argcmd import complete
+from argcmd import compiler
+from argcmd import files
+from argcmd import jobs
+from argcmd import search
+from argcmd.files import LazyFile, MappedFile, LineFile
+from argcmd.meter import progress
 from gettext import gettext as _
 
 # prefix for functions to find automatic
@@ -65,6 +75,29 @@ class _AliasedSubParsersAction(argparse._SubParsersAction):
         return sup.__call__(parser, namespace, values, *args, **kwargs)
 
 
+class _CompletionScriptAction(argparse.Action):
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, **kwargs):
+        sup = super(_CompletionScriptAction, self)
+        sup.__init__(option_strings, dest, default=default, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        sys.stdout.write(complete.script(parser, values))
+        parser.exit()
+
+
+class _CompleteValuesAction(argparse.Action):
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, **kwargs):
+        sup = super(_CompleteValuesAction, self)
+        sup.__init__(option_strings, dest, default=default, nargs=2, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        for value in complete.values(parser, *values):
+            sys.stdout.write(value + '\n')
+        parser.exit()
+
+
 def _dir_obj(obj):
     if isinstance(obj, basestring):
         obj = __import__(obj)
@@ -99,6 +132,11 @@ def _get_args_func(cmd_name, callables):
 
 
 def _get_commands(module):
+    """Find commands in module
+
+    Yields (instance, function, args function, command) tuples, where command
+    is the command already registered by a decorator, if any.
+    """
     # find all who inherits from argcmd
     argcmds = []
     for name, obj in _dir_obj(module):
@@ -118,18 +156,19 @@ def _get_commands(module):
         for name, f in obj_callables.items():
             cmd_inst[name] = obj
             if command.is_command(f):
-                cmd = command.get_command(f)
-                cmd._set_instance(obj, True)
                 obj_callables.pop(name)
+                yield obj, f, None, command.get_command(f)
 
         callables.update(obj_callables)
 
-    # find all cmd_ functions
+    # find all decorated and cmd_ functions
     for name, func in callables.iteritems():
         cmd_name = _get_cmd_name(name)
-        if cmd_name is not None:
+        if command.is_command(func):
+            yield None, func, None, command.get_command(func)
+        elif cmd_name is not None:
             inst = cmd_inst.get(name)
-            yield inst, func, _get_args_func(cmd_name, callables)
+            yield inst, func, _get_args_func(cmd_name, callables), None
 
 
 _indent_re = re.compile(r'(\s+)\S')
@@ -155,9 +194,12 @@ class _CommandExecutor(object):
 
     Makes sure to call certain functions on an object before first call to
     that objects function. If the object has been setup, it will also make
-    sure to call tear down.
+    sure to call tear down. File handles in the arguments are closed when the
+    function returns.
     """
+    # shared by all executors, unless set on the instance (see App)
     states = {}
+    lock = threading.RLock()
 
     __setup_func = 'start'
     __teardown_func = 'stop'
@@ -168,23 +210,34 @@ class _CommandExecutor(object):
     def __repr__(self):
         return '%s(func=%s)' % (self.__class__.__name__, self.func)
 
-    @classmethod
-    def _call_once(cls, obj, func_name):
-        states = cls.states.setdefault(func_name, {})
-        if obj.__class__ not in states:
-            states[obj.__class__] = getattr(obj, func_name)()
-        return states[obj.__class__]
+    def _call_once(self, obj, func_name):
+        # commands may run in several threads, make sure no thread runs a
+        # command before start has returned
+        with self.lock:
+            states = self.states.setdefault(func_name, {})
+            if obj.__class__ not in states:
+                states[obj.__class__] = getattr(obj, func_name)()
+            return states[obj.__class__]
+
+    def set_up(self, obj):
+        if obj is not None:
+            return self._call_once(obj, self.__setup_func)
 
     def tear_down(self, obj):
         if obj:
-            states = self.states.get(self.__setup_func)
-            if states is not None and obj.__class__ in states:
-                return self._call_once(obj, self.__teardown_func)
+            with self.lock:
+                states = self.states.get(self.__setup_func)
+                if states is not None and obj.__class__ in states:
+                    return self._call_once(obj, self.__teardown_func)
 
     def __call__(self, obj, *args, **kwargs):
-        if obj is not None:
-            self._call_once(obj, self.__setup_func)
-        return self.func(*args, **kwargs)
+        self.set_up(obj)
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            for arg in args:
+                if isinstance(arg, argparse.Namespace):
+                    files.close_all(arg)
 
 
 class command(object):
@@ -193,6 +246,7 @@ class command(object):
     Registers a subcommand function.
     """
     __commands = {}
+    __index = None
 
     @classmethod
     def is_command(cls, obj):
@@ -219,6 +273,20 @@ class command(object):
     def _get_commands(cls):
         return cls.__commands.itervalues()
 
+    @classmethod
+    def _get_names(cls):
+        names = set()
+        for cmd in cls._get_commands():
+            names.update([cmd.name] + cmd.aliases)
+        return names
+
+    @classmethod
+    def _get_index(cls):
+        # built once, dropped when commands change
+        if cls.__index is None:
+            cls.__index = _build_index(cls._get_commands())
+        return cls.__index
+
     @classmethod
     def tear_down(self):
         for cmd in command._get_commands():
@@ -227,6 +295,7 @@ class command(object):
     @classmethod
     def _reset(cls):
         cls.__commands = {}
+        cls.__index = None
         _CommandExecutor.states = {}
 
     def __init__(self, args=None, alias=None):
@@ -242,6 +311,8 @@ class command(object):
         if alias:
             self.add_alias(alias)
 
+        self.completers = []
+
     def __call__(self, f):
         # create a wraper to make us able to add attributes
         def command_wrapper(*args, **kwargs):
@@ -261,6 +332,7 @@ class command(object):
 
     def _set_instance(self, obj, bind=False):
         self.inst = obj
+        command.__index = None
 
         # make sure we call functions with self
         if bind:
@@ -268,24 +340,63 @@ class command(object):
             f.__doc__ = self.func.func.__doc__
             self.func.func = f
 
-    def _register_command(self, f):
+    def _set_function(self, f):
+        self.target = f
         self.func = _CommandExecutor(f)
         self.name = f.func_name.replace(CMD_NAME, '', 1).replace('_', '-')
+
+    def _copy(self, obj=None):
+        """Return an unregistered copy, bound to `obj` if given"""
+        cmd = command()
+        cmd._set_function(self.target)
+        cmd.name = self.name
+        cmd.aliases = list(self.aliases)
+        cmd.parser_funcs = list(self.parser_funcs)
+        cmd.completers = list(self.completers)
+        if obj is not None:
+            cmd._set_instance(obj, True)
+        return cmd
+
+    def _register_command(self, f):
+        self._set_function(f)
         if self.name in self.__commands:
             raise KeyError('Duplicate command handler: ' + self.name)
 
         self.__commands[self.name] = self
+        command.__index = None
 
     def add_alias(self, alias):
         if isinstance(alias, basestring):
             alias = [alias]
         self.aliases.extend(alias)
+        command.__index = None
 
     def add_parser_func(self, func, front=False):
         if front:
             self.parser_funcs.insert(0, func)
         else:
             self.parser_funcs.append(func)
+        command.__index = None
+
+    def add_completer(self, option_strings, nargs, func, front=False):
+        completer = (option_strings, nargs, func)
+        if front:
+            self.completers.insert(0, completer)
+        else:
+            self.completers.append(completer)
+
+    def _get_completer(self, n):
+        func = self.completers[n][2]
+        if func is not None:
+            return functools.partial(self._call_completer, func)
+
+    def _call_completer(self, func):
+        # completers may be names of methods of this command's instance,
+        # which is started first just like when running the command
+        self.func.set_up(self.inst)
+        if isinstance(func, basestring):
+            func = getattr(self.inst, func)
+        return func()
 
     def _setup_parser(self, parser):
         for parser_func in self.parser_funcs:
@@ -293,6 +404,45 @@ class command(object):
                 parser_func = getattr(self.inst, parser_func)
             parser = parser_func(parser)
 
+    def _bind_completers(self, parser):
+        for action in parser._actions:
+            func = getattr(action, 'completer', None)
+            if func is not None:
+                action.completer = functools.partial(self._call_completer,
+                                                     func)
+
+
+class _ArgumentRecorder(object):
+    """Stand-in parser recording the arguments added by parser functions"""
+    def __init__(self, arguments=None):
+        self.arguments = [] if arguments is None else arguments
+
+    def add_argument(self, *args, **kwargs):
+        help = kwargs.get('help')
+        if help != argparse.SUPPRESS:
+            self.arguments.append((args, help))
+        return argparse.Namespace()
+
+    def add_argument_group(self, *args, **kwargs):
+        return _ArgumentRecorder(self.arguments)
+
+    add_mutually_exclusive_group = add_argument_group
+
+    def __getattr__(self, name):
+        # anything else, eg. set_defaults, is ignored
+        return lambda *args, **kwargs: None
+
+
+def _build_index(commands):
+    # arguments are found without setting up any parsers
+    index = search.Index()
+    for cmd in commands:
+        recorder = _ArgumentRecorder()
+        cmd._setup_parser(recorder)
+        index.add_command(cmd.name, cmd.aliases,
+                          _get_doc_lines(cmd.func.func), recorder.arguments)
+    return index
+
 
 class _ExtraDecorator(object):
     def __init__(self, *args, **kwargs):
@@ -344,10 +494,24 @@ class argument(_ExtraDecorator):
 
     See ``argparse`` for syntax. Example:
         @argcmd.argument('-f', '--foobar', ...)
+
+    The extra keyword argument `completer` takes a callable (or name of an
+    instance method) returning the candidates for the argument value, which
+    are used for completion in the interactive shell.
     """
     def register(self, cmd, *args, **kwargs):
+        completer = kwargs.pop('completer', None)
+        option_strings = [a for a in args if a.startswith('-')]
+
+        # positionals are always recorded to keep track of their position
+        if completer is not None or not option_strings:
+            cmd.add_completer(option_strings, kwargs.get('nargs'), completer,
+                              True)
+
         def add_argument(parser):
-            parser.add_argument(*args, **kwargs)
+            action = parser.add_argument(*args, **kwargs)
+            if completer is not None:
+                action.completer = completer
             return parser
         cmd.add_parser_func(add_argument, True)
 
@@ -398,21 +562,40 @@ def add_shell_args(parser, prog):
     group.add_argument('--history-file', default=history_file, metavar='PATH', help='history [%(default)s]')
     group.add_argument('--enable-history', dest='history', action='store_true', default=False, help='enable command history [%(default)s]')
     group.add_argument('--disable-history', dest='history', action='store_false', help='disable command history')
+    group.add_argument('--complete-ttl', type=float, default=complete.COMPLETE_TTL, metavar='SECONDS', help='keep completion values for [%(default)s]')
+    group.add_argument('--complete-deadline', type=float, default=complete.COMPLETE_DEADLINE, metavar='SECONDS', help='max time to wait for completion values [%(default)s]')
+
+
+def _seconds(value):
+    seconds = float(value)
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError('invalid interval: %r' % (value,))
+    return seconds
+
+
+def add_watch_args(parser):
+    group = parser.add_argument_group('watch arguments')
+    group.add_argument('--watch', type=_seconds, metavar='SECONDS', help='run the command repeatedly, every SECONDS')
+    group.add_argument('--watch-changes', action='store_true', default=False, help='only print output that changed since the previous run')
 
 
 def run_shell(parser, args):
     """Interactive shell"""
-    words = trie.Trie()
-    for cmd in command._get_commands():
-        words.insert(cmd.name)
-
-    def complete(text, state):
-        matches = [w for w in words.search(text)]
-        if matches and state < len(matches):
+    cache = complete.Cache(args.complete_ttl, verbose=args.verbosity > 2)
+    completer = complete.Completer(command._get_commands(), cache,
+                                   args.complete_deadline)
+
+    # readline asks for one match at a time, find them all on the first call
+    matches = []
+    def complete_word(text, state):
+        if state == 0:
+            line = readline.get_line_buffer()[:readline.get_begidx()]
+            matches[:] = completer.complete(line, text)
+        if state < len(matches):
             return matches[state]
 
     readline.parse_and_bind('tab: complete')
-    readline.set_completer(complete)
+    readline.set_completer(complete_word)
 
     # enable command line history
     if args.history:
@@ -423,21 +606,55 @@ def run_shell(parser, args):
             readline.write_history_file(history_path)
         atexit.register(save_history)
 
+    # registered commands take precedence over built-in commands
+    _shell_loop(parser, jobs.JobTable(), command._get_names())
+
+
+def _read_line(prompt):
+    # raw_input only uses readline when sys.stdout is a real file. put back
+    # the stream while background jobs are redirecting it, and install the
+    # proxy again once readline has started reading
+    jobs.suspend('stdout')
+    readline.set_startup_hook(functools.partial(jobs.resume, 'stdout'))
+    try:
+        return raw_input(prompt)
+    finally:
+        readline.set_startup_hook()
+        jobs.resume('stdout')
+
+
+def _shell_loop(parser, table, names):
     # command line loop
     while True:
+        table.notify()
         try:
             # TODO add get_prompt callback
-            line = raw_input('>>> ').strip()
+            line = _read_line('>>> ').strip()
         except (EOFError, KeyboardInterrupt):
             print ''
             break
+
+        background = line.endswith('&')
+        if background:
+            line = line[:-1].strip()
+
+        words = line.split()
         if line == '':
             continue
         elif line == 'quit':
             break
+        elif words[0] in jobs.BUILTINS + ('help',) and words[0] not in names:
+            if background:
+                sys.stderr.write('%s: can not run in the background\n' % (
+                                 words[0],))
+            elif words[0] == 'help':
+                run_help(lambda: parser, words[1:])
+            else:
+                table.builtin(words[0], words[1:])
+            continue
 
         try:
-            args = parser.parse_args(line.split())
+            args = parser.parse_args(words)
         except ArgParseError, exc:
             # TODO see below on next ArgParseError
             if exc.status:
@@ -446,7 +663,51 @@ def run_shell(parser, args):
             # TODO
             raise
         else:
-            exc, code = _run_command(args.func, args)
+            if background:
+                table.start(line, functools.partial(_run_args, args))
+                continue
+
+            # Ctrl-C cancels the command, not the shell
+            try:
+                exc, code = _run_args(args)
+            except KeyboardInterrupt:
+                print ''
+
+    table.close()
+
+
+def run_help(get_parser, args, index=None):
+    """Built-in help command
+
+        help                show help
+        help COMMAND        show help for a command
+        help -k TERM...     search commands
+    """
+    if args[:1] == ['-k']:
+        if len(args) < 2:
+            sys.stderr.write('help: error: -k requires a search term\n')
+            return RC_PARSE_ERROR
+
+        # searching is done without setting up any parsers
+        if index is None:
+            index = command._get_index()
+        results = index.search(args[1:])
+        width = max([len(name) for name, summary in results] or [0])
+        for name, summary in results:
+            sys.stdout.write('  %-*s  %s\n' % (width, name, summary))
+        return RC_OK
+
+    parser = get_parser()
+    if not args:
+        parser.print_help()
+        return RC_OK
+
+    try:
+        parser.parse_args([args[0], '-h'])
+    except ArgParseError, exc:
+        if exc.status:
+            sys.stderr.write('%s: error: %s\n' % (parser.prog, exc.error))
+        return exc.status
 
 
 def _run_command(func, args):
@@ -477,7 +738,55 @@ def _run_command(func, args):
         return None, code
 
 
-def _setup_parsers(prog):
+def _watch_command(func, args):
+    """Run the command every `args.watch` seconds until interrupted
+
+    The command is run on a fixed schedule; runs taking longer than the
+    interval skip the missed runs rather than shifting the schedule.
+    """
+    interval = args.watch
+    stdout = sys.stdout
+    previous = []
+    code = RC_OK
+
+    next_run = time.time()
+    try:
+        while True:
+            if args.watch_changes:
+                # capture this thread only, the command may run next to others
+                buffer = cStringIO.StringIO()
+                redirection = jobs.redirect('stdout', buffer)
+                try:
+                    exc, code = _run_command(func, args)
+                finally:
+                    jobs.restore(redirection)
+                lines = buffer.getvalue().splitlines(True)
+
+                # write inserted and replaced lines only
+                matcher = difflib.SequenceMatcher(None, previous, lines)
+                for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                    if tag in ('replace', 'insert'):
+                        stdout.writelines(lines[j1:j2])
+                stdout.flush()
+                previous = lines
+            else:
+                exc, code = _run_command(func, args)
+
+            next_run += interval
+            now = time.time()
+            if next_run < now:
+                next_run += (int((now - next_run) / interval) + 1) * interval
+            time.sleep(next_run - now)
+    except KeyboardInterrupt:
+        # Ctrl-C is only seen by the main thread, elsewhere the command is
+        # being killed, eg. as a background job
+        if not isinstance(threading.current_thread(), threading._MainThread):
+            raise
+
+    return None, code
+
+
+def _setup_parsers(prog, compiled=False, commands=None):
     parent_parser = argparse.ArgumentParser(prog=prog, add_help=False)
     group = parent_parser.add_argument_group('global arguments')
 
@@ -516,11 +825,16 @@ def _setup_parsers(prog):
         parsers.append(parser)
 
     # setup the 2nd parser for sub-command
+    parser.add_argument('--completion-script', action=_CompletionScriptAction, choices=sorted(complete.SCRIPTS), help='print shell completion script and exit')
+    parser.add_argument('--complete-values', action=_CompleteValuesAction, metavar=('COMMAND', 'DEST'), help=argparse.SUPPRESS)
+    add_watch_args(parser)
     subparsers = parser.add_subparsers(dest='subparser_name')
     patch_parser(subparsers)
 
     # setup the parser for all commands
-    for cmd in command._get_commands():
+    if commands is None:
+        commands = command._get_commands()
+    for cmd in commands:
         doc_lines = _get_doc_lines(cmd.func.func)
 
         help = doc_lines[0]
@@ -535,11 +849,16 @@ def _setup_parsers(prog):
 
         cmd_parser.set_defaults(func=cmd.execute)
         cmd._setup_parser(cmd_parser)
+        cmd._bind_completers(cmd_parser)
+
+    if compiled:
+        compiler.patch_parser(parser)
 
     return parsers
 
 
-def main(module='__main__', prog=None, shell=False, args=None):
+def main(module='__main__', prog=None, shell=False, args=None,
+         compiled=False):
     """Main entrance for a program
 
     Call this function in your file to automatically populate an argument
@@ -554,18 +873,27 @@ def main(module='__main__', prog=None, shell=False, args=None):
         `prog`          -- name of the program
         `shell`         -- include interactive shell, disabled by default
         `args`          -- arguments to parse (defaults to sys.argv[1:])
+        `compiled`      -- use compiled parsers for commands that support it
     """
     # automatically populate commands found in module
     if module is not None:
-        for cmd_inst, cmd_func, cmd_args in _get_commands(module):
-            command._add_command(cmd_inst, cmd_func, cmd_args)
-
-    shell_parser, parser = _setup_parsers(prog)
-    func = None
+        for cmd_inst, cmd_func, cmd_args, cmd in _get_commands(module):
+            if cmd is None:
+                command._add_command(cmd_inst, cmd_func, cmd_args)
+            elif cmd_inst is not None:
+                cmd._set_instance(cmd_inst, True)
 
     if args is None:
         args = sys.argv[1:]
 
+    # built-in help command, unless overridden
+    if args[:1] == ['help'] and 'help' not in command._get_names():
+        get_parser = lambda: _setup_parsers(prog, compiled)[1]
+        return sys.exit(run_help(get_parser, args[1:]))
+
+    shell_parser, parser = _setup_parsers(prog, compiled)
+    func = None
+
     # first try to parse the command line for missing sub-command
     if shell:
         # XXX remove these args completley?
@@ -581,21 +909,137 @@ def main(module='__main__', prog=None, shell=False, args=None):
             pass
 
     # run main parser to see if it's a single run sub-command
-    if not func:
-        try:
-            cmd_args = parser.parse_args(args)
-            func = cmd_args.func
-        except ArgParseError, exc:
-            if exc.status:
-                # TODO clean this up and try to use the real error function found
-                # in the argparse package (it's patched away, so this mimics it)
-                sys.stderr.write(parser.format_usage())
-                sys.stderr.write('%s: error: %s\n' % (parser.prog, exc.error))
-            return sys.exit(exc.status)
-
-    # run the command and send exit if successful
-    exc, code = _run_command(func, cmd_args)
+    if func:
+        exc, code = _run_command(func, cmd_args)
+    else:
+        code = _run(parser, args)
     # XXX only call tear_down if exc is None? pass exception?
     command.tear_down()
 
     return sys.exit(code)
+
+
+def _run(parser, args):
+    """Parse and run a single command, returns the exit code"""
+    try:
+        cmd_args = parser.parse_args(args)
+    except ArgParseError, exc:
+        if exc.status:
+            # TODO clean this up and try to use the real error function found
+            # in the argparse package (it's patched away, so this mimics it)
+            sys.stderr.write(parser.format_usage())
+            sys.stderr.write('%s: error: %s\n' % (parser.prog, exc.error))
+        return exc.status
+
+    # run the command and send exit if successful
+    exc, code = _run_args(cmd_args)
+    return code
+
+
+def _run_args(args):
+    """Run the parsed command, repeatedly if --watch is given"""
+    if getattr(args, 'watch', None):
+        return _watch_command(args.func, args)
+    return _run_command(args.func, args)
+
+
+class Result(collections.namedtuple('Result', 'code stdout stderr')):
+    """Result of ``App.invoke``
+
+    Output written to a stream given to ``invoke`` is not captured, hence
+    stdout or stderr is None in that case.
+    """
+
+
+class App(object):
+    """Application with its own commands
+
+    Unlike ``main``, an app keeps its commands, parsers and started
+    instances to itself. Commands can be invoked any number of times, from
+    several threads and next to other apps. Instances are started on first
+    use and stopped by ``close``. Example:
+        with argcmd.App(module) as app:
+            result = app.invoke(['foo', '--bar'])
+
+    Keyword arguments:
+        `module`        -- where to automatically search for commands
+        `prog`          -- name of the program
+        `compiled`      -- use compiled parsers for commands that support it
+    """
+    def __init__(self, module='__main__', prog=None, compiled=False):
+        self.prog = prog
+        self.compiled = compiled
+        self.commands = {}
+        self.names = set()
+        self.states = {}
+        self.lock = threading.RLock()
+        self.__parser = None
+        self.__index = None
+
+        for cmd_inst, cmd_func, cmd_args, cmd in _get_commands(module):
+            if cmd is None:
+                cmd = command(cmd_args)
+                cmd._set_function(cmd_func)
+                cmd._set_instance(cmd_inst)
+            else:
+                cmd = cmd._copy(cmd_inst)
+            self._add_command(cmd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _add_command(self, cmd):
+        if cmd.name in self.commands:
+            raise KeyError('Duplicate command handler: ' + cmd.name)
+
+        # keep track of started instances in the app
+        cmd.func.states = self.states
+        cmd.func.lock = self.lock
+        self.commands[cmd.name] = cmd
+        self.names.update([cmd.name] + cmd.aliases)
+
+    def _get_parser(self):
+        with self.lock:
+            if self.__parser is None:
+                shell_parser, self.__parser = _setup_parsers(
+                    self.prog, self.compiled, self.commands.values())
+        return self.__parser
+
+    def _get_index(self):
+        with self.lock:
+            if self.__index is None:
+                self.__index = _build_index(self.commands.values())
+        return self.__index
+
+    def invoke(self, args, stdout=None, stderr=None):
+        """Run a command, returns a ``Result``
+
+        Output is captured unless `stdout` or `stderr` is given, in which
+        case it is written to that stream instead.
+        """
+        streams = [stdout or cStringIO.StringIO(),
+                   stderr or cStringIO.StringIO()]
+        redirects = [jobs.redirect('stdout', streams[0]),
+                     jobs.redirect('stderr', streams[1])]
+        try:
+            if args[:1] == ['help'] and 'help' not in self.names:
+                code = run_help(self._get_parser, args[1:], self._get_index())
+            else:
+                code = _run(self._get_parser(), args)
+        finally:
+            for redirection in redirects:
+                jobs.restore(redirection)
+
+        return Result(code, *[None if given else stream.getvalue()
+                              for given, stream in zip((stdout, stderr),
+                                                       streams)])
+
+    def close(self):
+        """Stop all started instances"""
+        with self.lock:
+            for cmd in self.commands.values():
+                cmd.func.tear_down(cmd.inst)
+            self.states.clear()
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+"""Compiled argument parser
+
+argparse matches each command line against regular expressions built from
+all actions of the parser. For the common case -- flags, options taking one
+value and positionals -- a parser can instead be compiled once into lookup
+tables and a command line parsed by walking it from left to right.
+
+The compiled parser gives up on anything it does not handle, be it an
+unsupported feature or a command line argparse would reject, and the caller
+falls back to argparse. Conversion of values and storing them in the namespace
+is still done by the argparse actions, making the resulting namespaces
+identical. Values are only converted once the command line is known to be
+complete; a value failing to convert is reported by the parser, just like
+argparse does, so a ``type`` is never called twice for the same value.
+"""
+
+import argparse
+import sys
+
+# actions taking no value
+_FLAG_ACTIONS = (argparse._StoreConstAction, argparse._StoreTrueAction,
+                 argparse._StoreFalseAction, argparse._AppendConstAction,
+                 argparse._CountAction)
+
+# actions taking values
+_VALUE_ACTIONS = (argparse._StoreAction, argparse._AppendAction)
+
+# min and max number of strings for positional nargs
+_NARGS = {
+    None: (1, 1),
+    argparse.OPTIONAL: (0, 1),
+    argparse.ZERO_OR_MORE: (0, sys.maxint),
+    argparse.ONE_OR_MORE: (1, sys.maxint),
+}
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _is_option(arg):
+    return arg[:1] == '-' and arg != '-'
+
+
+def _check_parser(parser):
+    if (parser.prefix_chars != '-' or
+            parser.fromfile_prefix_chars is not None or
+            parser._mutually_exclusive_groups):
+        raise _Unsupported(parser.prog)
+
+
+def _compile_options(parser, outer=None):
+    """Map option strings to (action, takes value) or None if unsupported"""
+    options = {}
+    for action in parser._actions:
+        if type(action) in _FLAG_ACTIONS:
+            option = action, False
+        elif type(action) in _VALUE_ACTIONS and action.nargs is None:
+            option = action, True
+        else:
+            option = None
+
+        for option_string in action.option_strings:
+            options[option_string] = option
+
+    # the outer parser sees all options of the sub-command as well, make sure
+    # it would not fail on them being ambiguous abbreviations
+    if outer is not None:
+        for option_string in options:
+            if option_string in outer._option_string_actions:
+                continue
+            for probe in (option_string, option_string + '=x'):
+                if len(outer._get_option_tuples(probe)) > 1:
+                    options[option_string] = None
+
+    return options
+
+
+def _defaults(parser, namespace):
+    for action in parser._actions:
+        if action.dest is not argparse.SUPPRESS:
+            if not hasattr(namespace, action.dest):
+                if action.default is not argparse.SUPPRESS:
+                    setattr(namespace, action.dest, action.default)
+
+    for dest in parser._defaults:
+        if not hasattr(namespace, dest):
+            setattr(namespace, dest, parser._defaults[dest])
+
+    return namespace
+
+
+def _missing(parser, seen):
+    """Return True if a required action is not in `seen`"""
+    for action in parser._actions:
+        if action.required and action not in seen:
+            return True
+    return False
+
+
+def _apply(parser, steps, namespace):
+    for action, strings, option_string in steps:
+        values = parser._get_values(action, strings)
+        action(parser, namespace, values, option_string)
+
+
+def _finish(parser, seen, namespace):
+    for action in parser._actions:
+        if action not in seen:
+            if (action.default is not None and
+                    isinstance(action.default, basestring) and
+                    hasattr(namespace, action.dest) and
+                    action.default is getattr(namespace, action.dest)):
+                setattr(namespace, action.dest,
+                        parser._get_value(action, action.default))
+
+
+class _Program(object):
+    """Compiled parser for a single command"""
+    def __init__(self, parser, outer):
+        _check_parser(parser)
+        self.parser = parser
+        self.options = _compile_options(parser, outer)
+
+        self.positionals = []
+        for action in parser._actions:
+            if action.option_strings:
+                continue
+            elif type(action) not in _VALUE_ACTIONS:
+                raise _Unsupported(action.dest)
+            elif isinstance(action.nargs, int):
+                nargs = action.nargs, action.nargs
+            elif action.nargs in _NARGS:
+                nargs = _NARGS[action.nargs]
+            else:
+                raise _Unsupported(action.dest)
+            self.positionals.append((action,) + nargs)
+
+    def _consume(self, positionals, args, start, stop, steps):
+        # greedy match of positionals to args, the same way as the regular
+        # expressions used by argparse
+        count = stop - start
+        n = need = 0
+        for action, least, most in positionals:
+            if need + least > count:
+                break
+            need += least
+            n += 1
+
+        for action, least, most in positionals[:n]:
+            need -= least
+            taken = min(most, count - need)
+            steps.append((action, args[start:start + taken], None))
+            start += taken
+            count -= taken
+
+        return positionals[n:], start
+
+    def scan(self, args):
+        """Split `args` into steps of (action, strings, option string)"""
+        steps = []
+        positionals = self.positionals
+        start = i = 0
+        count = len(args)
+        while i < count:
+            arg = args[i]
+            if not _is_option(arg):
+                i += 1
+                continue
+
+            option_string, explicit = arg, None
+            option = self.options.get(arg)
+            if option is None and '=' in arg:
+                option_string, explicit = arg.split('=', 1)
+                option = self.options.get(option_string)
+            if option is None:
+                return None
+
+            # positionals preceding the option, leftovers are extras
+            if start < i:
+                positionals, start = self._consume(positionals, args, start,
+                                                   i, steps)
+                if start < i:
+                    return None
+
+            action, takes_value = option
+            if not takes_value:
+                if explicit is not None:
+                    return None
+                steps.append((action, [], option_string))
+                i += 1
+            elif explicit is not None:
+                steps.append((action, [explicit], option_string))
+                i += 1
+            elif i + 1 < count and not _is_option(args[i + 1]):
+                steps.append((action, [args[i + 1]], option_string))
+                i += 2
+            else:
+                return None
+            start = i
+
+        positionals, start = self._consume(positionals, args, start, count,
+                                           steps)
+        if positionals or start < count:
+            return None
+
+        return steps
+
+    def parse(self, steps):
+        namespace = _defaults(self.parser, argparse.Namespace())
+        try:
+            _apply(self.parser, steps, namespace)
+            _finish(self.parser, set(step[0] for step in steps), namespace)
+        except argparse.ArgumentError, exc:
+            self.parser.error(str(exc))
+        return namespace
+
+
+class CompiledParser(object):
+    """Compiled parser for a parser with sub-commands
+
+    Only sub-commands which can be compiled are handled, for everything else
+    ``parse_args`` returns None.
+    """
+    def __init__(self, parser):
+        _check_parser(parser)
+        self.parser = parser
+        self.options = _compile_options(parser)
+
+        positionals = [a for a in parser._actions if not a.option_strings]
+        if (len(positionals) != 1 or
+                not isinstance(positionals[0], argparse._SubParsersAction)):
+            raise _Unsupported(parser.prog)
+        self.subparsers = positionals[0]
+
+        self.programs = {}
+        for name, choice in self.subparsers.choices.items():
+            if isinstance(choice, argparse.ArgumentParser):
+                try:
+                    self.programs[name] = _Program(choice, parser)
+                except _Unsupported:
+                    pass
+
+    def parse_args(self, args):
+        """Parse `args` like ``parse_args`` or return None to give up"""
+        steps = []
+        i, count = 0, len(args)
+        while i < count and _is_option(args[i]):
+            option = self.options.get(args[i])
+            if option is None or option[1]:
+                return None
+            steps.append((option[0], [], args[i]))
+            i += 1
+
+        if i == count:
+            return None
+
+        # sub-command name or alias
+        name = args[i]
+        choice = self.subparsers.choices.get(name)
+        if isinstance(choice, basestring):
+            name = choice
+        program = self.programs.get(name)
+        if program is None:
+            return None
+
+        sub_steps = program.scan(args[i + 1:])
+        if sub_steps is None:
+            return None
+
+        # leave missing arguments to argparse before converting any value
+        seen = set(step[0] for step in steps)
+        seen.add(self.subparsers)
+        if (_missing(self.parser, seen) or
+                _missing(program.parser, set(step[0] for step in sub_steps))):
+            return None
+
+        parser = self.parser
+        namespace = _defaults(parser, argparse.Namespace())
+        try:
+            _apply(parser, steps, namespace)
+        except argparse.ArgumentError, exc:
+            parser.error(str(exc))
+
+        if self.subparsers.dest is not argparse.SUPPRESS:
+            setattr(namespace, self.subparsers.dest, name)
+        for key, value in vars(program.parse(sub_steps)).items():
+            setattr(namespace, key, value)
+
+        try:
+            _finish(parser, seen, namespace)
+        except argparse.ArgumentError, exc:
+            parser.error(str(exc))
+
+        return namespace
+
+
+def patch_parser(parser):
+    """Make ``parser.parse_args`` use a compiled parser when possible"""
+    try:
+        compiled = CompiledParser(parser)
+    except _Unsupported:
+        return parser
+
+    parse_args = parser.parse_args
+    def compiled_parse_args(args=None, namespace=None):
+        if args is not None and namespace is None:
+            result = compiled.parse_args(list(args))
+            if result is not None:
+                return result
+        return parse_args(args, namespace)
+
+    parser.parse_args = compiled_parse_args
+    return parser
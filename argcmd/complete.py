@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+"""Shell completion
+
+Completes command names from a trie and argument values from completer
+callbacks registered with ``@argcmd.argument(..., completer=func)``. Values
+are fetched in background threads and cached for a while, so a slow callback
+never blocks the prompt for longer than the given deadline.
+
+Completion scripts for bash, zsh and fish can be generated from the parsers,
+letting the shell complete commands without starting python.
+"""
+
+import argparse
+import re
+import sys
+import threading
+import time
+import traceback
+
+from argcmd import trie
+
+# default number of seconds candidates are kept
+COMPLETE_TTL = 30.0
+# default number of seconds to wait for candidates on tab
+COMPLETE_DEADLINE = 0.2
+
+
+class Cache(object):
+    """Completion candidate cache
+
+    Candidates are fetched in a background thread and kept for `ttl` seconds.
+    A lookup waits at most `deadline` seconds for a fetch to finish; after that
+    stale values are returned, or the partial result if nothing was fetched
+    before. Failed fetches are reported to stderr, once per key, if
+    `verbose` is set.
+    """
+
+    class Entry(object):
+        """Cache entry"""
+        def __init__(self):
+            self.values = None              # last complete result
+            self.expires = 0                # when values turn stale
+            self.pending = None             # partial result of running fetch
+            self.done = threading.Event()   # set when no fetch is running
+            self.failed = False             # set when a fetch was reported
+
+    def __init__(self, ttl=COMPLETE_TTL, clock=time.time, verbose=False):
+        self.ttl = ttl
+        self.clock = clock
+        self.verbose = verbose
+        self.__entries = {}
+        self.__lock = threading.Lock()
+
+    def prefetch(self, key, func):
+        """Fetch values for `key` unless fresh or already being fetched"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                entry = self.__entries[key] = self.Entry()
+            if entry.pending is not None or self.clock() < entry.expires:
+                return entry
+            entry.pending = []
+            entry.done.clear()
+
+        thread = threading.Thread(target=self._fetch, args=(key, entry, func))
+        thread.daemon = True
+        thread.start()
+        return entry
+
+    def _fetch(self, key, entry, func):
+        pending = entry.pending
+        try:
+            for value in func():
+                pending.append(value)
+        except Exception:
+            # keep any stale values, next lookup will try again
+            pending = None
+            if self.verbose and not entry.failed:
+                entry.failed = True
+                sys.stderr.write('\ncompletion of %r failed:\n%s' % (
+                                 key, traceback.format_exc()))
+
+        with self.__lock:
+            if pending is not None:
+                entry.values = pending
+                entry.expires = self.clock() + self.ttl
+            entry.pending = None
+            entry.done.set()
+
+    def get(self, key, func, deadline=COMPLETE_DEADLINE):
+        """Get values for `key`, waiting at most `deadline` seconds"""
+        entry = self.prefetch(key, func)
+        entry.done.wait(deadline)
+
+        with self.__lock:
+            if entry.values is not None:
+                return list(entry.values)
+            elif entry.pending is not None:
+                return list(entry.pending)
+            return []
+
+
+class Completer(object):
+    """Command line completer
+
+    Completes the first word to a command name and any following word using
+    the completers registered for the command. Arguments:
+        commands    -- iterable of registered commands
+        cache       -- candidate cache (see ``Cache``)
+        deadline    -- max number of seconds to wait for candidates
+    """
+    def __init__(self, commands, cache=None, deadline=COMPLETE_DEADLINE):
+        self.cache = cache or Cache()
+        self.deadline = deadline
+
+        self.words = trie.Trie()
+        self.commands = {}
+        for cmd in commands:
+            self.words.insert(cmd.name)
+            for name in [cmd.name] + cmd.aliases:
+                self.commands[name] = cmd
+
+    def _find_completer(self, cmd, words):
+        options = {}
+        positionals = []
+        for n, (option_strings, nargs, func) in enumerate(cmd.completers):
+            if option_strings:
+                for option_string in option_strings:
+                    options[option_string] = n
+            else:
+                positionals.append((n, nargs))
+
+        # value for an option
+        if words and words[-1] in options:
+            return options[words[-1]]
+
+        # best effort: count positionals, skipping option values we know of
+        index = 0
+        for n, word in enumerate(words):
+            if word.startswith('-'):
+                continue
+            elif n > 0 and words[n - 1] in options:
+                continue
+            index += 1
+
+        if positionals:
+            if index < len(positionals):
+                return positionals[index][0]
+            n, nargs = positionals[-1]
+            if nargs in ('*', '+', '...'):
+                return n
+
+    def prefetch(self, cmd):
+        """Start fetching candidates for all completers of `cmd`"""
+        for n in range(len(cmd.completers)):
+            func = cmd._get_completer(n)
+            if func is not None:
+                self.cache.prefetch((cmd.name, n), func)
+
+    def complete(self, line, text):
+        """Return all matches for `text`, where `line` is the text before it"""
+        words = line.split()
+        if not words:
+            # start fetching values as soon as the command is known
+            names = list(self.words.search(text))
+            cmd = self.commands.get(text)
+            if cmd is None and len(names) == 1:
+                cmd = self.commands[names[0]]
+            if cmd is not None:
+                self.prefetch(cmd)
+            return names
+
+        cmd = self.commands.get(words[0])
+        if cmd is None:
+            return []
+        self.prefetch(cmd)
+
+        n = self._find_completer(cmd, words[1:])
+        func = n is not None and cmd._get_completer(n)
+        if not func:
+            return []
+
+        values = self.cache.get((cmd.name, n), func, self.deadline)
+        return [str(v) for v in values if str(v).startswith(text)]
+
+
+def _get_subparsers(parser):
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            return action
+
+
+def _get_help(parser, action):
+    if action.help:
+        return parser._get_formatter()._expand_help(action)
+    return ''
+
+
+class _Argument(object):
+    """Completion information for an argument"""
+    def __init__(self, parser, action):
+        self.dest = action.dest
+        self.option_strings = action.option_strings
+        self.takes_value = action.nargs != 0
+        self.repeats = action.nargs in ('*', '+', '...')
+        self.choices = [str(c) for c in action.choices or ()]
+        self.dynamic = getattr(action, 'completer', None) is not None
+        self.help = _get_help(parser, action)
+
+
+class _Command(object):
+    """Completion information for a command"""
+    def __init__(self, name, parser, help):
+        self.name = name
+        self.aliases = []
+        self.help = help
+        self.options = []
+        self.positionals = []
+        for action in parser._actions:
+            if not action.option_strings:
+                self.positionals.append(_Argument(parser, action))
+            elif action.help != argparse.SUPPRESS:
+                self.options.append(_Argument(parser, action))
+
+
+def _get_spec(parser):
+    """Collect global options and commands from a parser"""
+    options = []
+    for action in parser._actions:
+        if action.option_strings and action.help != argparse.SUPPRESS:
+            options.append(_Argument(parser, action))
+
+    commands = []
+    subparsers = _get_subparsers(parser)
+    if subparsers is not None:
+        helps = dict((a.dest, a.help) for a in subparsers._choices_actions)
+        by_name = {}
+        for name, choice in subparsers.choices.items():
+            if isinstance(choice, argparse.ArgumentParser):
+                cmd = _Command(name, choice, helps.get(name) or '')
+                by_name[name] = cmd
+                commands.append(cmd)
+        for alias, choice in subparsers.choices.items():
+            if isinstance(choice, basestring):
+                by_name[choice].aliases.append(alias)
+        commands.sort(key=lambda cmd: cmd.name)
+
+    return options, commands
+
+
+def _quote(value):
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def _words(values):
+    return _quote(' '.join(values))
+
+
+def _option_words(arguments):
+    return [s for argument in arguments for s in argument.option_strings]
+
+
+_BASH_SCRIPT = """\
+# bash completion for %(prog)s, generated by `%(prog)s --completion-script bash`
+%(func)s() {
+    local cur prev cmd i n
+    cur="${COMP_WORDS[COMP_CWORD]}"
+    prev="${COMP_WORDS[COMP_CWORD-1]}"
+    COMPREPLY=()
+
+    # find the sub-command
+    cmd=
+    for ((i = 1; i < COMP_CWORD; i++)); do
+        case "${COMP_WORDS[i]}" in
+%(skip)s            -*) ;;
+            *) cmd="${COMP_WORDS[i]}"; break ;;
+        esac
+    done
+
+    if [ -z "$cmd" ]; then
+%(values)s        COMPREPLY=($(compgen -W %(words)s -- "$cur"))
+        return
+    fi
+
+    case "$cmd" in
+%(commands)s
+    esac
+}
+complete -o default -F %(func)s %(prog)s
+"""
+
+
+def _bash_reply(cmd, argument):
+    if argument.dynamic:
+        words = '"$("${COMP_WORDS[0]}" --complete-values %s %s 2>/dev/null)"' % (
+            _quote(cmd.name), _quote(argument.dest))
+    else:
+        words = _words(argument.choices)
+    return 'COMPREPLY=($(compgen -W %s -- "$cur"))' % (words,)
+
+
+def _bash_values(cmd, options, indent):
+    value_options = [a for a in options if a.takes_value]
+    if not value_options:
+        return []
+
+    lines = [indent + 'case "$prev" in']
+    for argument in value_options:
+        pattern = '|'.join(argument.option_strings)
+        if argument.choices or argument.dynamic:
+            lines.append(indent + '    %s) %s; return ;;' % (
+                         pattern, _bash_reply(cmd, argument)))
+        else:
+            lines.append(indent + '    %s) return ;;' % (pattern,))
+    lines.append(indent + 'esac')
+    return lines
+
+
+def _bash_command(cmd):
+    value_options = [a for a in cmd.options if a.takes_value]
+    lines = ['        %s)' % ('|'.join([cmd.name] + cmd.aliases),)]
+
+    # values for options
+    lines.extend(_bash_values(cmd, cmd.options, ' ' * 12))
+
+    lines.extend([
+        '            if [[ "$cur" == -* ]]; then',
+        '                COMPREPLY=($(compgen -W %s -- "$cur"))' % (
+            _words(_option_words(cmd.options)),),
+        '                return',
+        '            fi'])
+
+    # values for positionals, counting the ones before the current word
+    positionals = [(n, a) for n, a in enumerate(cmd.positionals)
+                   if a.choices or a.dynamic]
+    if positionals:
+        lines.extend([
+            '            n=0',
+            '            for ((i = i + 1; i < COMP_CWORD; i++)); do',
+            '                case "${COMP_WORDS[i]}" in'])
+        if value_options:
+            lines.append('                    %s) i=$((i + 1)) ;;' % (
+                         '|'.join(_option_words(value_options)),))
+        lines.extend([
+            '                    -*) ;;',
+            '                    *) n=$((n + 1)) ;;',
+            '                esac',
+            '            done',
+            '            case $n in'])
+        last = len(cmd.positionals) - 1
+        for n, argument in positionals:
+            pattern = str(n)
+            if n == last and argument.repeats:
+                pattern = '*'
+            lines.append('                %s) %s ;;' % (
+                         pattern, _bash_reply(cmd, argument)))
+        lines.append('            esac')
+
+    lines.append('            ;;')
+    return '\n'.join(lines)
+
+
+def _bash_script(prog, options, commands):
+    words = _option_words(options)
+    for cmd in commands:
+        words.extend([cmd.name] + cmd.aliases)
+
+    skip = values = ''
+    value_options = _option_words([a for a in options if a.takes_value])
+    if value_options:
+        skip = ' ' * 12 + '%s) i=$((i + 1)) ;;\n' % ('|'.join(value_options),)
+        values = '\n'.join(_bash_values(None, options, ' ' * 8)) + '\n'
+
+    return _BASH_SCRIPT % {
+        'prog': prog,
+        'func': '_' + re.sub(r'\W', '_', prog) + '_complete',
+        'skip': skip,
+        'values': values,
+        'words': _words(words),
+        'commands': '\n'.join(_bash_command(cmd) for cmd in commands),
+    }
+
+
+def _zsh_script(prog, options, commands):
+    # the bash completion is reused, the script is sourced from .zshrc
+    # rather than installed as a #compdef function on $fpath
+    return '\n'.join([
+        '# zsh completion for %s, source the output of '
+        '`%s --completion-script zsh`' % (prog, prog),
+        '(( $+functions[compdef] )) || { autoload -U +X compinit && compinit; }',
+        'autoload -U +X bashcompinit && bashcompinit',
+        _bash_script(prog, options, commands)])
+
+
+def _fish_quote(value):
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def _fish_argument(prog, condition, cmd, argument):
+    line = ['complete -c', prog, '-n', _fish_quote(condition)]
+    for option_string in argument.option_strings:
+        if option_string.startswith('--'):
+            line.extend(['-l', option_string[2:]])
+        elif len(option_string) == 2:
+            line.extend(['-s', option_string[1:]])
+        else:
+            line.extend(['-o', option_string[1:]])
+
+    # option values exclude files, positionals may be files as well
+    if argument.option_strings and argument.takes_value:
+        line.append('-r')
+        if argument.dynamic or argument.choices:
+            line.append('-f')
+
+    if argument.dynamic:
+        line.extend(['-a', _fish_quote('(%s --complete-values %s %s)' % (
+                     prog, _quote(cmd.name), _quote(argument.dest)))])
+    elif argument.choices:
+        line.extend(['-a', _fish_quote(' '.join(argument.choices))])
+    elif not argument.option_strings:
+        return None
+
+    if argument.help:
+        line.extend(['-d', _fish_quote(argument.help)])
+    return ' '.join(line)
+
+
+def _fish_script(prog, options, commands):
+    lines = ['# fish completion for %s, generated by '
+             '`%s --completion-script fish`' % (prog, prog)]
+
+    condition = '__fish_use_subcommand'
+    for argument in options:
+        lines.append(_fish_argument(prog, condition, None, argument))
+    for cmd in commands:
+        for name in [cmd.name] + cmd.aliases:
+            line = 'complete -c %s -n %s -f -a %s' % (
+                   prog, _fish_quote(condition), _fish_quote(name))
+            if cmd.help:
+                line += ' -d ' + _fish_quote(cmd.help)
+            lines.append(line)
+
+    for cmd in commands:
+        condition = '__fish_seen_subcommand_from ' + ' '.join(
+                    [cmd.name] + cmd.aliases)
+        for argument in cmd.options + cmd.positionals:
+            line = _fish_argument(prog, condition, cmd, argument)
+            if line is not None:
+                lines.append(line)
+
+    return '\n'.join(lines) + '\n'
+
+
+# script generators by shell name
+SCRIPTS = {
+    'bash': _bash_script,
+    'zsh': _zsh_script,
+    'fish': _fish_script,
+}
+
+
+def script(parser, shell):
+    """Return completion script for `shell` of commands found in `parser`
+
+    Everything static -- commands, aliases, options and choices -- is
+    completed by the shell itself. Only arguments with a completer call the
+    program, using the ``--complete-values`` option.
+    """
+    options, commands = _get_spec(parser)
+    return SCRIPTS[shell](parser.prog, options, commands)
+
+
+def values(parser, name, dest):
+    """Return candidates for argument `dest` of command `name`"""
+    subparsers = _get_subparsers(parser)
+    choice = subparsers.choices.get(name) if subparsers else None
+    if isinstance(choice, basestring):
+        choice = subparsers.choices[choice]
+    if choice is None:
+        return []
+
+    for action in choice._actions:
+        if action.dest == dest:
+            func = getattr(action, 'completer', None)
+            if func is not None:
+                return [str(v) for v in func()]
+            return [str(c) for c in action.choices or ()]
+    return []
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+"""File argument types
+
+Unlike ``argparse.FileType``, which opens files while parsing, these types
+return handles opening the file on first use. Example:
+    @argcmd.argument('input', type=argcmd.MappedFile())
+
+Handles found in the parsed arguments are closed when the command returns.
+They are opened again if used after that, eg. when the command is run
+repeatedly. A path of ``-`` refers to stdin, which is never closed.
+"""
+
+import argparse
+import mmap
+import os
+import sys
+
+# default number of bytes read at a time by ChunkedLines
+CHUNK_SIZE = 1 << 20
+
+
+class Handle(object):
+    """File handle opened on first use"""
+    def __init__(self, path, mode='r', bufsize=-1):
+        self.path = path
+        self.mode = mode
+        self.bufsize = bufsize
+        self._file = None
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def file(self):
+        """The underlying file object, opened if needed"""
+        if self._file is None:
+            if self.path == '-':
+                self._file = sys.stdout if 'w' in self.mode else sys.stdin
+            else:
+                self._file = open(self.path, self.mode, self.bufsize)
+        return self._file
+
+    def close(self):
+        f, self._file = self._file, None
+        if f is not None and self.path != '-':
+            f.close()
+
+
+class LazyFileHandle(Handle):
+    """File handle delegating to the file, opened on first use"""
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.file)
+
+
+class MappedBuffer(Handle):
+    """Read-only memory mapped file
+
+    Slicing copies the data, use ``view`` to get a buffer without copying.
+    Stdin is read into memory when it can not be mapped, eg. for a pipe.
+    """
+    def __init__(self, path):
+        super(MappedBuffer, self).__init__(path, 'rb')
+        self._map = None
+
+    @property
+    def map(self):
+        """The mapped file, or data read from a pipe"""
+        if self._map is None:
+            f = self.file
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                # empty files and pipes can not be mapped
+                self._map = f.read()
+        return self._map
+
+    def __len__(self):
+        return len(self.map)
+
+    def __getitem__(self, index):
+        return self.map[index]
+
+    def __getattr__(self, name):
+        return getattr(self.map, name)
+
+    def view(self, start=0, stop=None):
+        """Return a buffer of the data between `start` and `stop`"""
+        if stop is None:
+            stop = len(self.map)
+        return buffer(self.map, start, max(0, stop - start))
+
+    def close(self):
+        m, self._map = self._map, None
+        if isinstance(m, mmap.mmap):
+            m.close()
+        super(MappedBuffer, self).close()
+
+
+class ChunkedLines(Handle):
+    """Line iterator reading `size` bytes at a time"""
+    def __init__(self, path, size=CHUNK_SIZE):
+        super(ChunkedLines, self).__init__(path, 'r')
+        self.size = size
+
+    def chunks(self):
+        """Iterate over lists of lines of about `size` bytes"""
+        readlines = self.file.readlines
+        while True:
+            lines = readlines(self.size)
+            if not lines:
+                break
+            yield lines
+
+    def __iter__(self):
+        for lines in self.chunks():
+            for line in lines:
+                yield line
+
+
+class _FileType(object):
+    def __init__(self, handle, *args):
+        self.handle = handle
+        self.args = args
+
+    def __repr__(self):
+        args = ', '.join(repr(arg) for arg in self.args)
+        return '%s(%s)' % (self.__class__.__name__, args)
+
+    def __call__(self, path):
+        # check the file instead of opening it to report errors when parsing
+        if path != '-' and not self.writable() and not os.access(path, os.R_OK):
+            raise argparse.ArgumentTypeError("can't open '%s'" % (path,))
+        return self.handle(path, *self.args)
+
+    def writable(self):
+        return False
+
+
+class LazyFile(_FileType):
+    """Argument type for a file opened on first use
+
+    Arguments are the same as for ``open`` (and ``argparse.FileType``).
+    """
+    def __init__(self, mode='r', bufsize=-1):
+        super(LazyFile, self).__init__(LazyFileHandle, mode, bufsize)
+
+    def writable(self):
+        return any(c in self.args[0] for c in 'wa+')
+
+
+class MappedFile(_FileType):
+    """Argument type for a read-only memory mapped file"""
+    def __init__(self):
+        super(MappedFile, self).__init__(MappedBuffer)
+
+
+class LineFile(_FileType):
+    """Argument type for iterating over lines read `size` bytes at a time"""
+    def __init__(self, size=CHUNK_SIZE):
+        super(LineFile, self).__init__(ChunkedLines, size)
+
+
+def close_all(namespace):
+    """Close all handles found in the parsed arguments"""
+    for value in vars(namespace).itervalues():
+        if isinstance(value, Handle):
+            value.close()
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                if isinstance(item, Handle):
+                    item.close()
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+"""Background jobs for the interactive shell
+
+Commands ending with ``&`` are run in a worker thread. Anything the command
+writes to stdout or stderr is captured and written, tagged with the job id,
+once the job has finished. Jobs are managed with the built-in commands ``jobs``,
+``fg``, ``wait`` and ``kill``.
+"""
+
+import cStringIO
+import ctypes
+import sys
+import thread
+import threading
+
+# built-in shell commands
+BUILTINS = ('jobs', 'fg', 'wait', 'kill')
+
+# seconds to wait for a killed job to stop
+KILL_TIMEOUT = 0.5
+
+
+class ThreadOutput(object):
+    """Output stream redirecting writes of job threads to their buffers"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+
+    def write(self, data):
+        self.buffers.get(thread.get_ident(), self.stream).write(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def isatty(self):
+        ident = thread.get_ident()
+        return ident not in self.buffers and self.stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+# guards installing and removing the proxies
+_redirect_lock = threading.Lock()
+
+# proxies put aside by suspend
+_suspended = {}
+
+
+def redirect(name, stream):
+    """Redirect writes of this thread to ``sys.<name>`` into `stream`
+
+    The first redirection replaces the stream with a ``ThreadOutput``, which
+    is removed again when the last redirection is restored. Returns the
+    redirection to pass to ``restore``.
+    """
+    with _redirect_lock:
+        output = getattr(sys, name)
+        if not isinstance(output, ThreadOutput):
+            output = _suspended.get(name)
+        if output is None:
+            output = ThreadOutput(getattr(sys, name))
+            setattr(sys, name, output)
+
+        ident = thread.get_ident()
+        previous = output.buffers.get(ident)
+        output.buffers[ident] = stream
+    return name, output, previous
+
+
+def restore(redirection):
+    """Undo ``redirect``, put back the original stream if it was the last"""
+    name, output, previous = redirection
+    with _redirect_lock:
+        ident = thread.get_ident()
+        if previous is None:
+            del output.buffers[ident]
+        else:
+            output.buffers[ident] = previous
+
+        if not output.buffers:
+            if getattr(sys, name) is output:
+                setattr(sys, name, output.stream)
+            elif _suspended.get(name) is output:
+                del _suspended[name]
+
+
+def suspend(name):
+    """Put back the original ``sys.<name>`` until ``resume`` is called
+
+    Redirections made meanwhile still use the suspended proxy.
+    """
+    with _redirect_lock:
+        output = getattr(sys, name)
+        if isinstance(output, ThreadOutput):
+            _suspended[name] = output
+            setattr(sys, name, output.stream)
+
+
+def resume(name):
+    """Install the proxy put aside by ``suspend`` again, if still in use"""
+    with _redirect_lock:
+        output = _suspended.pop(name, None)
+        if output is not None:
+            setattr(sys, name, output)
+
+
+def _set_async_exc(ident, exc):
+    # raise `exc` in thread `ident`, None clears a pending exception
+    if exc is not None:
+        exc = ctypes.py_object(exc)
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(ident), exc)
+
+
+class Job(object):
+    """Command running in a worker thread"""
+    def __init__(self, id, line, func):
+        self.id = id
+        self.line = line
+        self.func = func
+        self.code = None
+        self.killing = False
+        self.killed = False
+
+        self.buffer = cStringIO.StringIO()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+
+        # kill only raises while the command is called
+        self.__lock = threading.Lock()
+        self.__calling = False
+
+    def _run(self):
+        redirections = [redirect('stdout', self.buffer),
+                        redirect('stderr', self.buffer)]
+        try:
+            self._call()
+        finally:
+            for redirection in redirections:
+                restore(redirection)
+
+    def _call(self):
+        with self.__lock:
+            if self.killing:
+                self.killed = True
+                return
+            self.__calling = True
+
+        try:
+            try:
+                exc, self.code = self.func()
+            finally:
+                self._returned()
+        except KeyboardInterrupt:
+            self.killed = True
+            self._returned()
+
+    def _returned(self):
+        # drop a kill still pending when a blocked command returns
+        with self.__lock:
+            self.__calling = False
+            _set_async_exc(self.thread.ident, None)
+
+    def is_running(self):
+        return self.thread.is_alive()
+
+    def kill(self, timeout=KILL_TIMEOUT):
+        """Raise KeyboardInterrupt in the job thread
+
+        The exception is raised at the next python instruction, a job blocked
+        in a system call is interrupted once the call returns. Returns True
+        if the job stopped within `timeout` seconds.
+        """
+        if self.is_running():
+            with self.__lock:
+                self.killing = True
+                if self.__calling:
+                    _set_async_exc(self.thread.ident, KeyboardInterrupt)
+            self.thread.join(timeout)
+        return not self.is_running()
+
+    def wait(self):
+        # join with timeout, a plain join is not interrupted by Ctrl-C
+        while self.is_running():
+            self.thread.join(0.1)
+
+    def status(self):
+        if self.is_running():
+            return 'Killing' if self.killing else 'Running'
+        elif self.killed:
+            return 'Killed'
+        elif self.code:
+            return 'Exit %s' % (self.code,)
+        return 'Done'
+
+
+class JobTable(object):
+    """Jobs started from the interactive shell"""
+    def __init__(self):
+        self.jobs = {}
+        self.__lock = threading.Lock()
+
+    def start(self, line, func):
+        """Run `func` as a background job, returns the job"""
+        with self.__lock:
+            job = Job(max(self.jobs or [0]) + 1, line, func)
+            self.jobs[job.id] = job
+        job.thread.start()
+        sys.stdout.write('[%d] %s\n' % (job.id, line))
+        return job
+
+    def get(self, id=None):
+        """Get job by id, or the most recent job"""
+        with self.__lock:
+            if id is None and self.jobs:
+                id = max(self.jobs)
+            return self.jobs.get(id)
+
+    def report(self, job):
+        """Write status and output of a finished job and forget it"""
+        with self.__lock:
+            self.jobs.pop(job.id, None)
+
+        stream = sys.stdout
+        stream.write('[%d] %s  %s\n' % (job.id, job.status(), job.line))
+        for line in job.buffer.getvalue().splitlines():
+            stream.write('[%d] %s\n' % (job.id, line))
+        stream.flush()
+
+    def notify(self):
+        """Report all finished jobs"""
+        with self.__lock:
+            finished = [j for j in self.jobs.values() if not j.is_running()]
+        for job in sorted(finished, key=lambda job: job.id):
+            self.report(job)
+
+    def wait(self, job):
+        """Wait for `job` in the foreground, Ctrl-C kills it"""
+        try:
+            job.wait()
+        except KeyboardInterrupt:
+            if not self.kill(job):
+                return
+        self.report(job)
+
+    def wait_all(self):
+        for job in sorted(self.jobs.values(), key=lambda job: job.id):
+            self.wait(job)
+
+    def kill(self, job):
+        """Kill `job`, returns False if it did not stop"""
+        if job.kill():
+            return True
+        sys.stderr.write('[%d] blocked in a call, killed once it returns: '
+                         '%s\n' % (job.id, job.line))
+        return False
+
+    def close(self):
+        """Report finished jobs and abandon running ones
+
+        Jobs are run in daemon threads, so jobs blocked in a call do not keep
+        the program from exiting and are not waited for.
+        """
+        for job in sorted(self.jobs.values(), key=lambda job: job.id):
+            if job.kill(0):
+                self.report(job)
+            else:
+                sys.stdout.write('[%d] Abandoned  %s\n' % (job.id, job.line))
+        self.jobs.clear()
+
+    def builtin(self, name, args):
+        """Run built-in command `name`, returns exit code"""
+        if name == 'jobs':
+            for job in sorted(self.jobs.values(), key=lambda job: job.id):
+                sys.stdout.write('[%d] %s  %s\n' % (
+                                 job.id, job.status(), job.line))
+            return 0
+        elif name == 'wait' and not args:
+            self.wait_all()
+            return 0
+
+        jobs = []
+        for arg in args or [None]:
+            job = None
+            try:
+                job = self.get(arg if arg is None else int(arg.lstrip('%')))
+            except ValueError:
+                pass
+            if job is None:
+                sys.stderr.write('%s: %s: no such job\n' % (name, arg or ''))
+                return 1
+            jobs.append(job)
+
+        code = 0
+        for job in jobs:
+            if name == 'kill':
+                if not self.kill(job):
+                    code = 1
+            else:
+                self.wait(job)
+        return code
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+"""Progress reporting
+
+Wraps an iterable and redraws a status line with count, throughput and ETA
+at most every `interval` seconds. Example:
+    for line in argcmd.progress(lines, args=args):
+        ...
+
+Nothing is rendered when quiet or when stdout is not a terminal, the
+iterable is then returned as is. Otherwise the loop only counts items and
+looks at the clock every so many items, adjusted to the rate seen so far.
+A timer thread makes sure the clock is looked at, at least once per
+interval, when items suddenly take longer.
+"""
+
+import sys
+import threading
+import time
+
+# seconds between redraws
+REDRAW_INTERVAL = 0.2
+
+# number of clock checks per redraw interval
+CHECKS_PER_REDRAW = 4
+
+
+def _format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%d:%02d:%02d' % (hours, minutes, seconds)
+
+
+class Meter(object):
+    """Iterator over `iterable` drawing progress to `stream`"""
+    def __init__(self, iterable, total=None, color=False, stream=None,
+                 interval=REDRAW_INTERVAL, clock=time.time):
+        if total is None:
+            try:
+                total = len(iterable)
+            except TypeError:
+                pass
+
+        self.iterable = iterable
+        self.total = total
+        self.color = color
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.clock = clock
+
+        self.count = 0
+        self.check = 1
+        self.__width = 0
+
+    def __iter__(self):
+        start = last = self.clock()
+        redraw = start + self.interval
+        count = last_count = 0
+
+        # the number of items between clock checks is derived from the rate
+        # so far, the timer forces a check each interval in case items slow
+        # down
+        next_check = [self.check]
+        done = []
+        timer = threading.Thread(target=self._timer, args=(next_check, done))
+        timer.daemon = True
+        timer.start()
+        try:
+            for item in self.iterable:
+                yield item
+                count += 1
+                if count < next_check[0]:
+                    continue
+
+                # check the clock about CHECKS_PER_REDRAW times per redraw
+                now = self.clock()
+                if now > last:
+                    rate = (count - last_count) / (now - last)
+                    self.check = max(1, int(rate * self.interval /
+                                            CHECKS_PER_REDRAW))
+                last, last_count = now, count
+                next_check[0] = count + self.check
+
+                if now >= redraw:
+                    self.count = count
+                    self.draw(now - start)
+                    redraw = now + self.interval
+        finally:
+            done.append(True)
+            self.count = count
+            self.draw(self.clock() - start)
+            self.stream.write('\n')
+            self.stream.flush()
+
+    def _timer(self, next_check, done, sleep=time.sleep):
+        # no globals are used, the thread may outlive the interpreter
+        while not done:
+            sleep(self.interval)
+            next_check[0] = 0
+
+    def format(self, elapsed):
+        """Return the status line after `elapsed` seconds"""
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        if self.total:
+            percent = '%5.1f%%' % (100.0 * self.count / self.total,)
+            if self.color:
+                percent = '\x1b[36m%s\x1b[0m' % (percent,)
+            line = '%s %d/%d %.1f/s' % (percent, self.count, self.total, rate)
+            if self.count < self.total and rate > 0:
+                eta = (self.total - self.count) / rate
+                line += ' ETA %s' % (_format_time(eta),)
+            else:
+                line += ' %s' % (_format_time(elapsed),)
+        else:
+            line = '%d %.1f/s %s' % (self.count, rate, _format_time(elapsed))
+        return line
+
+    def draw(self, elapsed):
+        line = self.format(elapsed)
+        # pad with spaces to clear the previous line
+        self.stream.write('\r%s%s' % (line, ' ' * (self.__width - len(line))))
+        self.stream.flush()
+        self.__width = len(line)
+
+
+def progress(iterable, total=None, args=None, stream=None,
+             interval=REDRAW_INTERVAL):
+    """Iterate over `iterable` while reporting progress
+
+    Arguments:
+        iterable    -- items to iterate over
+        total       -- number of items, defaults to len(iterable) if known
+        args        -- parsed arguments, honors --quiet and --color
+        stream      -- stream to draw on, defaults to stdout
+        interval    -- seconds between redraws
+    """
+    if stream is None:
+        stream = sys.stdout
+    verbosity = getattr(args, 'verbosity', 2)
+    color = getattr(args, 'color', False)
+
+    isatty = getattr(stream, 'isatty', None)
+    if not verbosity or isatty is None or not isatty():
+        return iterable
+    return Meter(iterable, total, color, stream, interval)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+"""Command search
+
+An inverted index over command names, aliases, documentation and help of
+arguments, used by ``help -k``. Terms are matched exactly or by prefix and
+results are ranked by where the terms were found.
+"""
+
+import re
+
+from argcmd import trie
+
+# weight of a term by where it was found
+WEIGHT_NAME = 10
+WEIGHT_ALIAS = 8
+WEIGHT_SUMMARY = 4
+WEIGHT_OPTION = 3
+WEIGHT_DESCRIPTION = 2
+WEIGHT_HELP = 1
+
+# factor for terms only matching by prefix
+PREFIX_FACTOR = 0.5
+
+_format_re = re.compile(r'%\(\w+\)\w')
+_term_re = re.compile(r'[a-z0-9]+(?:[-_][a-z0-9]+)*')
+
+
+def _get_terms(text):
+    terms = set()
+    for term in _term_re.findall(_format_re.sub('', text.lower())):
+        terms.add(term)
+        terms.update(re.split(r'[-_]', term))
+    return terms
+
+
+class Index(object):
+    """Inverted index of commands"""
+    def __init__(self):
+        self.postings = {}
+        self.summaries = {}
+        self.words = trie.Trie()
+
+    def add(self, name, text, weight):
+        """Add terms in `text` found in command `name`"""
+        for term in _get_terms(text):
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self.words.insert(term)
+            postings[name] = max(weight, postings.get(name, 0))
+
+    def add_command(self, name, aliases, doc_lines, arguments):
+        """Add command with its documentation and arguments
+
+        Arguments:
+            name        -- command name
+            aliases     -- list of command aliases
+            doc_lines   -- documentation lines, first line is the summary
+            arguments   -- list of (argument names, help) tuples
+        """
+        self.summaries[name] = doc_lines[0] if doc_lines else ''
+        self.add(name, name, WEIGHT_NAME)
+        for alias in aliases:
+            self.add(name, alias, WEIGHT_ALIAS)
+        self.add(name, self.summaries[name], WEIGHT_SUMMARY)
+        self.add(name, '\n'.join(doc_lines[1:]), WEIGHT_DESCRIPTION)
+        for names, help in arguments:
+            self.add(name, ' '.join(names), WEIGHT_OPTION)
+            self.add(name, help or '', WEIGHT_HELP)
+
+    def search(self, query):
+        """Return (name, summary) of commands matching all terms in `query`
+
+        Results are ranked, best match first.
+        """
+        scores = None
+        for term in _get_terms(' '.join(query)):
+            matches = {}
+            for word in self.words.search(term):
+                factor = 1 if word == term else PREFIX_FACTOR
+                for name, weight in self.postings[word].iteritems():
+                    matches[name] = max(weight * factor, matches.get(name, 0))
+
+            if scores is None:
+                scores = matches
+            else:
+                scores = dict((name, score + matches[name])
+                              for name, score in scores.iteritems()
+                              if name in matches)
+
+        ranked = sorted((scores or {}).items(), key=lambda i: (-i[1], i[0]))
+        return [(name, self.summaries[name]) for name, score in ranked]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+import cStringIO
+import sys
+import threading
+import unittest
+
+import argcmd
+
+
+class Counter(argcmd.ArgCmd):
+    def start(self):
+        self.calls = 0
+        self.stops = 0
+        print 'start'
+
+    def stop(self):
+        self.stops += 1
+
+    @argcmd.argument('name')
+    def hello(self, args):
+        """say hello"""
+        self.calls += 1
+        print 'hello %s %d' % (args.name, self.calls)
+
+    def cmd_fail(self, args):
+        """fail"""
+        raise ValueError('failed')
+
+
+def cmd_exit(args):
+    return 3
+
+
+class Pinger(argcmd.ArgCmd):
+    def hosts(self):
+        return ['alpha', 'beta']
+
+    @argcmd.argument('host', completer='hosts')
+    def ping(self, args):
+        """ping host"""
+        print 'ping %s' % (args.host,)
+
+
+class AppTest(unittest.TestCase):
+    module = {'Counter': Counter, 'cmd_exit': cmd_exit}
+
+    def test_invoke(self):
+        app = argcmd.App(self.module, prog='prog')
+        self.assertEquals(argcmd.Result(0, 'start\nhello foo 1\n', ''),
+                          app.invoke(['hello', 'foo']))
+        self.assertEquals(argcmd.Result(0, 'hello bar 2\n', ''),
+                          app.invoke(['hello', 'bar']))
+        self.assertEquals(3, app.invoke(['exit']).code)
+        self.assertEquals(argcmd.Result(argcmd.RC_CMD_ERROR,
+                                        'ERR: failed\n', ''),
+                          app.invoke(['fail', '--no-color']))
+
+        result = app.invoke(['nope'])
+        self.assertEquals(argcmd.RC_PARSE_ERROR, result.code)
+        self.assertTrue("invalid choice: 'nope'" in result.stderr)
+
+        result = app.invoke(['help', '-k', 'hello'])
+        self.assertEquals('  hello  say hello\n', result.stdout)
+
+    def test_completer(self):
+        # completers given by name are methods of the app's own instance
+        app = argcmd.App({'Pinger': Pinger})
+        self.assertEquals('ping x\n', app.invoke(['ping', 'x']).stdout)
+        self.assertEquals('alpha\nbeta\n', app.invoke(
+                          ['--complete-values', 'ping', 'host']).stdout)
+
+    def test_streams(self):
+        stdout = cStringIO.StringIO()
+        with argcmd.App(self.module) as app:
+            result = app.invoke(['hello', 'foo'], stdout=stdout)
+        self.assertEquals(argcmd.Result(0, None, ''), result)
+        self.assertEquals('start\nhello foo 1\n', stdout.getvalue())
+
+    def test_isolated(self):
+        # apps have their own instances and registry
+        names = argcmd.command._get_names()
+        apps = [argcmd.App(self.module) for n in range(2)]
+        apps[0].invoke(['hello', 'foo'])
+        self.assertEquals('hello foo 1\n',
+                          apps[1].invoke(['hello', 'foo']).stdout[6:])
+
+        inst = apps[0].commands['hello'].inst
+        apps[0].close()
+        self.assertEquals(1, inst.stops)
+        self.assertEquals(names, argcmd.command._get_names())
+
+    def test_threads(self):
+        stdout = sys.stdout
+        apps = [argcmd.App(self.module, compiled=True) for n in range(4)]
+        errors = []
+
+        def run(app, name):
+            for n in range(200):
+                result = app.invoke(['hello', name])
+                if not result.stdout.endswith('hello %s %d\n' % (name, n + 1)):
+                    errors.append(result)
+
+        threads = [threading.Thread(target=run, args=(app, 'app%d' % (n,)))
+                   for n, app in enumerate(apps)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals([], errors)
+        # the streams are put back once the last invocation returned
+        self.assertTrue(sys.stdout is stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
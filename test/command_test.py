@@ -2,7 +2,11 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2011 Örjan Persson
 
+import argparse
 import mock
+import sys
+import threading
+import time
 import unittest
 
 import argcmd
@@ -48,6 +52,22 @@ class CommandExecutorTest(TestCase):
         self.assertEquals(cmd.stop.call_count, 1)
         self.assertEquals(cmd.foo.call_count, 2)
 
+    def test_call_once_threads(self):
+        cmd = self.TestCommand()
+        cmd.start.side_effect = lambda: time.sleep(0.01)
+        calls = []
+        exc = argcmd._CommandExecutor(lambda: calls.append(1))
+
+        threads = [threading.Thread(target=exc, args=(cmd,))
+                   for n in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(cmd.start.call_count, 1)
+        self.assertEquals(len(calls), 10)
+
     def test_command(self):
         t_cmd = self.TestCommand()
         argcmd.command._add_command(t_cmd, t_cmd.foo)
@@ -133,6 +153,130 @@ class CommandTest(TestCase):
                 pass
         self.assertRaises(KeyError, argcmd.main, module=locals())
 
+    @mock.patch('sys.stdout')
+    @mock.patch('sys.exit')
+    @mock.patch('argcmd._setup_parsers')
+    def test_help_search(self, mock_setup, mock_exit, mock_stdout):
+        @argcmd.argument('-H', '--host', help='host to query')
+        def cmd_stats(args):
+            """show queue statistics"""
+
+        @argcmd.command()
+        def cmd_hosts(args):
+            """list hosts"""
+
+        # help of options added by args functions is indexed as well
+        class Test(argcmd.ArgCmd):
+            def args_ls(self, parser):
+                group = parser.add_argument_group('listing')
+                group.add_argument('-a', '--all', action='store_true',
+                                   help='do not ignore entries starting '
+                                        'with .')
+                parser.add_argument('--secret', help=argparse.SUPPRESS)
+
+            @argcmd.command(args='args_ls')
+            def cmd_ls(self, args):
+                """list files"""
+
+        argcmd.main(module=locals(), args=['help', '-k', 'host'])
+        mock_exit.assert_called_with(argcmd.RC_OK)
+        self.assertFalse(mock_setup.called)
+
+        written = ''.join(c[0][0] for c in mock_stdout.write.call_args_list)
+        self.assertEquals('  hosts  list hosts\n'
+                          '  stats  show queue statistics\n', written)
+
+        mock_stdout.reset_mock()
+        argcmd.main(module=None, args=['help', '-k', 'entries'])
+        argcmd.main(module=None, args=['help', '-k', 'secret'])
+        written = ''.join(c[0][0] for c in mock_stdout.write.call_args_list)
+        self.assertEquals('  ls  list files\n', written)
+
+    @mock.patch('sys.exit')
+    def test_help_override(self, mock_exit):
+        def cmd_help(args):
+            return 'test_help_override'
+
+        argcmd.main(module=locals(), args=['help'])
+        mock_exit.assert_called_with('test_help_override')
+
+
+class WatchTest(TestCase):
+    def setUp(self):
+        super(WatchTest, self).setUp()
+        self.now = 100.0
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        if len(self.sleeps) == 4:
+            raise KeyboardInterrupt()
+
+    @mock.patch('sys.exit')
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    def test_schedule(self, mock_time, mock_sleep, mock_exit):
+        mock_time.side_effect = lambda: self.now
+        mock_sleep.side_effect = self.sleep
+
+        class Test(argcmd.ArgCmd):
+            start = mock.Mock()
+            stop = mock.Mock()
+
+            def cmd_foo(test, args):
+                # every other run overruns the interval
+                self.now += [0.5, 2.5][len(self.sleeps) % 2]
+
+        argcmd.main(module=locals(), args=['--watch', '2', 'foo'])
+        self.assertEquals([1.5, 1.5, 1.5, 1.5], self.sleeps)
+        self.assertEquals(1, Test.start.call_count)
+        self.assertEquals(1, Test.stop.call_count)
+        mock_exit.assert_called_with(argcmd.RC_OK)
+
+    @mock.patch('sys.stdout')
+    @mock.patch('sys.exit')
+    @mock.patch('time.sleep')
+    def test_changes(self, mock_sleep, mock_exit, mock_stdout):
+        mock_sleep.side_effect = self.sleep
+        outputs = iter(['a\nb\n', 'a\nb\n', 'a\nc\n', 'a\nc\nd\n'])
+
+        def cmd_foo(args):
+            sys.stdout.write(outputs.next())
+
+            # output of other threads is not captured
+            other = threading.Thread(target=sys.stdout.write,
+                                     args=('other\n',))
+            other.start()
+            other.join()
+
+        argcmd.main(module=locals(), args=['--watch', '1', '--watch-changes',
+                                           'foo'])
+        written = ''.join(''.join(c[0][0]) for c in
+                          mock_stdout.writelines.call_args_list)
+        self.assertEquals('a\nb\nc\nd\n', written)
+        self.assertEquals(4, mock_stdout.write.call_args_list.count(
+                          mock.call('other\n')))
+        self.assertTrue(sys.stdout is mock_stdout)
+
+    @mock.patch('sys.stdout')
+    @mock.patch('time.sleep')
+    @mock.patch('__builtin__.raw_input')
+    def test_shell(self, mock_input, mock_sleep, mock_stdout):
+        mock_input.side_effect = ['--watch 1 foo', EOFError()]
+        mock_sleep.side_effect = self.sleep
+        calls = []
+
+        @argcmd.command()
+        def cmd_foo(args):
+            calls.append(args)
+
+        # honored in the shell as well, Ctrl-C stops watching
+        shell_parser, parser = argcmd._setup_parsers('prog')
+        argcmd._shell_loop(parser, argcmd.jobs.JobTable(),
+                           argcmd.command._get_names())
+        self.assertEquals(4, len(calls))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+import itertools
+import mock
+import random
+import unittest
+
+import argcmd
+from argcmd import compiler
+
+
+class CompiledParserTest(unittest.TestCase):
+    # tokens used to build command lines
+    tokens = ['run', 'r', 'ls', 'opt', 'cfg', '-v', '-q', '--color',
+              '--no-color', '-H', '--host', '--host=h', '-n', '--num=3', '-x',
+              '--tag', '--flag', '-f', 'a', 'b', '1', '-', '--', '--ho',
+              '-Hfoo', '-vq', '', 'fast', 'slow']
+
+    def setUp(self):
+        argcmd.command._reset()
+
+        @argcmd.alias('r')
+        @argcmd.argument('-H', '--host', default='localhost')
+        @argcmd.argument('-n', '--num', type=int, default='1')
+        @argcmd.argument('--tag', action='append')
+        @argcmd.argument('-f', '--flag', action='store_true')
+        @argcmd.argument('job')
+        @argcmd.argument('paths', nargs='*')
+        def cmd_run(args):
+            pass
+
+        @argcmd.argument('-x', action='count')
+        @argcmd.argument('path', nargs='?', default='.')
+        def cmd_ls(args):
+            pass
+
+        @argcmd.argument('mode', choices=['fast', 'slow'])
+        @argcmd.argument('rest', nargs='+')
+        @argcmd.argument('-n', type=int, required=True)
+        def cmd_opt(args):
+            pass
+
+        def args_cfg(parser):
+            group = parser.add_mutually_exclusive_group()
+            group.add_argument('-a', action='store_true')
+            group.add_argument('-b', action='store_true')
+
+        @argcmd.command(args_cfg)
+        def cfg(args):
+            pass
+
+        shell_parser, self.parser = argcmd._setup_parsers('prog')
+        self.compiled = compiler.CompiledParser(self.parser)
+
+    def assert_parse(self, args):
+        try:
+            expected = self.parser.parse_args(args)
+        except argcmd.ArgParseError, exc:
+            expected = exc.status, exc.error
+
+        # values failing to convert are reported like argparse does
+        try:
+            result = self.compiled.parse_args(list(args))
+        except argcmd.ArgParseError, exc:
+            result = exc.status, exc.error
+            self.assertEquals(expected, result, args)
+        else:
+            if result is not None:
+                self.assertEquals(expected, result, args)
+                self.assertEquals(vars(expected), vars(result), args)
+        return result
+
+    def test_fast(self):
+        for args in (['run', 'a'],
+                     ['r', 'a', 'b', '1'],
+                     ['-v', 'run', '-H', 'foo', 'a', 'b', '-q', '--num=3'],
+                     ['run', '--host=h', 'a', '--tag', 'a', '--tag', 'b'],
+                     ['run', 'a', '-f', '-n', '7'],
+                     ['ls'],
+                     ['ls', '-x', '-x', 'a'],
+                     ['ls', '-'],
+                     ['opt', '-n', '1', 'fast', 'a', 'b']):
+            self.assertNotEqual(None, self.assert_parse(args), args)
+
+    @mock.patch('sys.stdout')
+    def test_fallback(self, mock_stdout):
+        for args in (['run'],
+                     ['run', '-h'],
+                     ['run', 'a', '--', 'b'],
+                     ['run', 'a', '-f', 'b'],
+                     ['ls', 'a', 'b'],
+                     ['opt', 'fast', 'a'],
+                     ['cfg', '-a'],
+                     ['nope'],
+                     []):
+            self.assertEquals(None, self.assert_parse(args), args)
+
+    def test_errors(self):
+        for args in (['run', 'a', '-n', 'x'],
+                     ['opt', '-n', '1', 'medium', 'a']):
+            self.assertEquals(argcmd.RC_PARSE_ERROR,
+                              self.assert_parse(args)[0], args)
+
+    def test_type_once(self):
+        calls = []
+        def counted(value):
+            calls.append(value)
+            return value
+
+        @argcmd.argument('--out', type=counted)
+        @argcmd.argument('-n', type=int)
+        @argcmd.argument('--req', required=True)
+        def cmd_write(args):
+            pass
+
+        # types are called as many times as by argparse, eg. a FileType
+        # must not open its file twice
+        parsers = [argcmd._setup_parsers('prog', compiled)[1]
+                   for compiled in (False, True)]
+        for args in (['write', '--out', 'f', '--req', 'r'],
+                     ['write', '--out', 'f', '-n', 'x', '--req', 'r'],
+                     ['write', '--req', 'r', '--out', 'f', '-n', 'x'],
+                     ['write', '--out', 'f']):
+            results = []
+            for parser in parsers:
+                del calls[:]
+                try:
+                    result = vars(parser.parse_args(args))
+                except argcmd.ArgParseError, exc:
+                    result = exc.status, exc.error
+                results.append((result, list(calls)))
+            self.assertEquals(results[0], results[1], args)
+            self.assertEquals(['f'], calls, args)
+
+    def test_differential(self):
+        rand = random.Random(42)
+        for n in range(4):
+            for args in itertools.product(['run', 'ls', 'r'],
+                                          *[self.tokens] * n):
+                if n < 3 or rand.random() < 0.05:
+                    self.assert_parse(list(args))
+
+        for i in range(20000):
+            args = [rand.choice(self.tokens)
+                    for n in range(rand.randint(0, 8))]
+            self.assert_parse(args)
+
+    def test_main(self):
+        calls = []
+        @argcmd.argument('-n', type=int)
+        def cmd_foo(args):
+            calls.append(args.n)
+
+        self.assertRaises(SystemExit, argcmd.main, module=None,
+                          args=['foo', '-n', '3'], compiled=True)
+        self.assertEquals([3], calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+import functools
+import mock
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+import argcmd
+from argcmd import complete
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = complete.Cache(10, clock=lambda: self.now)
+
+    def test_ttl(self):
+        calls = []
+        def func():
+            calls.append(1)
+            return ['a', 'b']
+
+        self.assertEquals(['a', 'b'], self.cache.get('k', func, 1))
+        self.assertEquals(['a', 'b'], self.cache.get('k', func, 1))
+        self.assertEquals(1, len(calls))
+
+        self.now = 11
+        self.assertEquals(['a', 'b'], self.cache.get('k', func, 1))
+        self.assertEquals(2, len(calls))
+
+    def test_deadline(self):
+        release = threading.Event()
+        def func():
+            yield 'a'
+            release.wait(5)
+            yield 'b'
+
+        # partial result when nothing has been fetched before
+        self.assertEquals(['a'], self.cache.get('k', func, 0.05))
+        release.set()
+        self.assertEquals(['a', 'b'], self.cache.get('k', func, 5))
+
+        # stale result while fetching again
+        release.clear()
+        self.now = 11
+        self.assertEquals(['a', 'b'], self.cache.get('k', func, 0.05))
+        release.set()
+
+    def test_error(self):
+        def func():
+            raise ValueError()
+        self.assertEquals([], self.cache.get('k', func, 1))
+
+    @mock.patch('sys.stderr')
+    def test_error_verbose(self, mock_stderr):
+        def func():
+            raise ValueError('no hosts')
+
+        # reported once per key
+        self.cache.verbose = True
+        for key in ['k', 'k', 'l']:
+            self.assertEquals([], self.cache.get(key, func, 1))
+        self.assertEquals(2, mock_stderr.write.call_count)
+        self.assertTrue('no hosts' in mock_stderr.write.call_args[0][0])
+
+
+class CompleterTest(unittest.TestCase):
+    def setUp(self):
+        argcmd.command._reset()
+
+    def test_complete(self):
+        @argcmd.argument('-H', '--host', completer=lambda: ['foo', 'bar'])
+        @argcmd.argument('job', completer=lambda: ['1', '2', '12'])
+        @argcmd.argument('paths', nargs='*', completer=lambda: ['/x', '/y'])
+        def cmd_run(args):
+            pass
+
+        @argcmd.alias('dir')
+        def cmd_ls(args):
+            pass
+
+        completer = complete.Completer(argcmd.command._get_commands())
+        self.assertEquals(['ls', 'run'], sorted(completer.complete('', '')))
+        self.assertEquals(['run'], completer.complete('', 'r'))
+        self.assertEquals([], completer.complete('ls', ''))
+        self.assertEquals([], completer.complete('dir', ''))
+        self.assertEquals(['1', '12'], completer.complete('run', '1'))
+        self.assertEquals(['foo'], completer.complete('run -H', 'f'))
+        self.assertEquals(['1', '12'], completer.complete('run -H foo', '1'))
+        self.assertEquals(['/x'], completer.complete('run 1', '/x'))
+        self.assertEquals(['/y'], completer.complete('run --host a 1 /x', '/y'))
+
+
+    def test_start(self):
+        class Hosts(argcmd.ArgCmd):
+            def start(self):
+                self.hosts = ['alpha', 'beta']
+
+            def get_hosts(self):
+                return self.hosts
+
+            @argcmd.argument('host', completer='get_hosts')
+            def cmd_ping(self, args):
+                pass
+
+        # the instance is started before its completers are called
+        for inst, func, args_func, cmd in argcmd._get_commands(locals()):
+            cmd._set_instance(inst, True)
+        completer = complete.Completer(argcmd.command._get_commands())
+        self.assertEquals(['alpha'], completer.complete('ping', 'a'))
+
+
+    def test_prefetch(self):
+        started = threading.Event()
+        def slow():
+            started.set()
+            time.sleep(0.2)
+            return ['alpha', 'beta']
+
+        @argcmd.argument('host', completer=slow)
+        def cmd_ping(args):
+            pass
+
+        @argcmd.command()
+        def cmd_put(args):
+            pass
+
+        completer = complete.Completer(argcmd.command._get_commands(),
+                                       deadline=0.1)
+        self.assertEquals(['ping', 'put'], sorted(completer.complete('', 'p')))
+        self.assertFalse(started.is_set())
+
+        # fetching starts while the command is completed
+        self.assertEquals(['ping'], completer.complete('', 'pi'))
+        self.assertTrue(started.wait(1))
+        time.sleep(0.3)
+        self.assertEquals(['alpha'], completer.complete('ping', 'a'))
+
+
+class ScriptTest(unittest.TestCase):
+    def setUp(self):
+        argcmd.command._reset()
+
+        @argcmd.alias('r')
+        @argcmd.argument('-H', '--host', completer=lambda: ['h1', 'h2'])
+        @argcmd.argument('--mode', choices=['fast', 'slow'])
+        @argcmd.argument('job', choices=['j1', 'j2'])
+        @argcmd.argument('paths', nargs='*', completer=lambda: ['/x'])
+        def cmd_run(args):
+            pass
+
+        shell_parser, self.parser = argcmd._setup_parsers('prog')
+
+    def test_values(self):
+        values = functools.partial(complete.values, self.parser)
+        self.assertEquals(['h1', 'h2'], values('r', 'host'))
+        self.assertEquals(['fast', 'slow'], values('run', 'mode'))
+        self.assertEquals([], values('foo', 'host'))
+
+    def test_script(self):
+        for shell in complete.SCRIPTS:
+            script = complete.script(self.parser, shell)
+            for word in ['run', 'r', 'host', 'fast slow', 'j1 j2',
+                         '--complete-values']:
+                self.assertTrue(word in script, (shell, word))
+
+        # sourced, not autoloaded from $fpath
+        self.assertFalse('#compdef' in complete.script(self.parser, 'zsh'))
+
+    @unittest.skipUnless(os.path.exists('/bin/bash'), 'requires bash')
+    def test_bash(self):
+        tests = [(['prog', ''], 'run r'),
+                 (['prog', 'r', '--mode', ''], 'fast slow'),
+                 (['prog', 'r', '-H', 'h1', ''], 'j1 j2'),
+                 (['prog', 'run', 'j1', '/'], '/x')]
+
+        with tempfile.NamedTemporaryFile(suffix='.sh') as f:
+            f.write(complete.script(self.parser, 'bash'))
+            f.write('prog() { echo /x; }\n')
+            for words, expected in tests:
+                f.write('COMP_WORDS=(%s); COMP_CWORD=%d; _prog_complete; '
+                        'echo "${COMPREPLY[*]}"\n' % (
+                        ' '.join(complete._quote(w) for w in words),
+                        len(words) - 1))
+            f.flush()
+
+            output = subprocess.check_output(['/bin/bash', f.name])
+            for line, (words, expected) in zip(output.splitlines(), tests):
+                self.assertTrue(line.endswith(expected), (words, line))
+
+
+if __name__ == '__main__':
+    unittest.main()
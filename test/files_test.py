@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import argcmd
+
+
+class FilesTest(unittest.TestCase):
+    def setUp(self):
+        argcmd.command._reset()
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'input')
+        with open(self.path, 'w') as f:
+            f.write('foo\nbar\nbaz\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_lazy(self):
+        handle = argcmd.LazyFile()(self.path)
+        self.assertEquals(None, handle._file)
+        self.assertEquals('foo\n', handle.readline())
+        self.assertEquals(['bar\n', 'baz\n'], list(handle))
+        handle.close()
+        self.assertEquals(None, handle._file)
+
+        # opened again when used after closing
+        self.assertEquals('foo\n', handle.readline())
+        handle.close()
+
+    def test_write(self):
+        path = os.path.join(self.tmpdir, 'output')
+        with argcmd.LazyFile('w')(path) as handle:
+            handle.write('foo')
+        with open(path) as f:
+            self.assertEquals('foo', f.read())
+
+    def test_missing(self):
+        path = os.path.join(self.tmpdir, 'missing')
+        for file_type in (argcmd.LazyFile(), argcmd.MappedFile(),
+                          argcmd.LineFile()):
+            self.assertRaises(argparse.ArgumentTypeError, file_type, path)
+
+    def test_mapped(self):
+        handle = argcmd.MappedFile()(self.path)
+        self.assertEquals(12, len(handle))
+        self.assertEquals('bar', handle[4:7])
+        self.assertEquals('bar', str(handle.view(4, 7)))
+        self.assertEquals(8, handle.find('baz'))
+        handle.close()
+        self.assertEquals(None, handle._map)
+
+    def test_mapped_empty(self):
+        path = os.path.join(self.tmpdir, 'empty')
+        open(path, 'w').close()
+        handle = argcmd.MappedFile()(path)
+        self.assertEquals(0, len(handle))
+        self.assertEquals('', str(handle.view()))
+        handle.close()
+
+    def test_lines(self):
+        handle = argcmd.LineFile(4)(self.path)
+        self.assertEquals(['foo\n', 'bar\n', 'baz\n'], list(handle))
+        handle.close()
+
+        lines = ['line %d\n' % (n,) for n in range(100000)]
+        with open(self.path, 'w') as f:
+            f.writelines(lines)
+        chunks = list(argcmd.LineFile(1 << 16)(self.path).chunks())
+        self.assertTrue(len(chunks) > 1)
+        self.assertEquals(lines, sum(chunks, []))
+
+    def test_stdin(self):
+        handle = argcmd.LineFile()('-')
+        self.assertTrue(handle.file is sys.stdin)
+        handle.close()
+        self.assertFalse(sys.stdin.closed)
+
+    def test_executor(self):
+        handles = []
+
+        @argcmd.argument('inputs', nargs='+', type=argcmd.LazyFile())
+        @argcmd.argument('--lines', type=argcmd.LineFile())
+        def cmd_foo(args):
+            handles.extend(args.inputs + [args.lines])
+            return ''.join(f.read() for f in args.inputs) + ''.join(args.lines)
+
+        shell_parser, parser = argcmd._setup_parsers('prog')
+        args = parser.parse_args(['foo', self.path, self.path,
+                                  '--lines', self.path])
+        result = args.func(args)
+
+        self.assertEquals('foo\nbar\nbaz\n' * 3, result)
+        self.assertEquals(3, len(handles))
+        for handle in handles:
+            self.assertEquals(None, handle._file)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+import cStringIO
+import mock
+import sys
+import threading
+import time
+import unittest
+
+import argcmd
+from argcmd import jobs
+
+
+class JobTableTest(unittest.TestCase):
+    def setUp(self):
+        self.stream = cStringIO.StringIO()
+        self.table = jobs.JobTable()
+        self.stdout, sys.stdout = sys.stdout, self.stream
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def test_output(self):
+        def func():
+            print 'foo'
+            print 'bar'
+            return None, 3
+
+        job = self.table.start('cmd arg', func)
+        print 'main'
+        self.table.builtin('fg', [])
+
+        self.assertEquals('[1] cmd arg\n'
+                          'main\n'
+                          '[1] Exit 3  cmd arg\n'
+                          '[1] foo\n'
+                          '[1] bar\n', self.stream.getvalue())
+        self.assertEquals(None, self.table.get())
+
+    def test_kill(self):
+        started = threading.Event()
+        def func():
+            started.set()
+            while True:
+                pass
+
+        job = self.table.start('spin', func)
+        started.wait(5)
+        self.table.builtin('jobs', [])
+        self.assertEquals(0, self.table.builtin('kill', ['%1']))
+        job.wait()
+        self.table.notify()
+
+        self.assertEquals('[1] spin\n'
+                          '[1] Running  spin\n'
+                          '[1] Killed  spin\n', self.stream.getvalue())
+
+    @mock.patch('sys.stderr')
+    def test_blocked(self, mock_stderr):
+        # a plain wait on an event can not be interrupted
+        started, release = threading.Event(), threading.Event()
+        def func():
+            started.set()
+            release.wait()
+            return None, 0
+
+        job = self.table.start('block', func)
+        started.wait(5)
+        time.sleep(0.1)
+        start = time.time()
+        self.assertEquals(1, self.table.builtin('kill', ['1']))
+        self.table.builtin('jobs', [])
+        self.table.close()
+        self.assertTrue(time.time() - start < 5)
+
+        # the job cleans up once the blocking call returns
+        release.set()
+        job.wait()
+        self.assertTrue(sys.stdout is self.stream)
+        self.assertTrue(sys.stderr is mock_stderr)
+
+        self.assertTrue('blocked' in mock_stderr.write.call_args[0][0])
+        self.assertEquals('[1] block\n'
+                          '[1] Killing  block\n'
+                          '[1] Abandoned  block\n', self.stream.getvalue())
+        self.assertEquals({}, self.table.jobs)
+
+    @mock.patch('sys.stderr')
+    def test_no_job(self, mock_stderr):
+        self.assertEquals(1, self.table.builtin('fg', []))
+        self.assertEquals(1, self.table.builtin('kill', ['x']))
+        self.assertEquals(1, self.table.builtin('wait', ['2']))
+
+    def test_wait(self):
+        for n in range(3):
+            self.table.start('job%d' % (n,), lambda: (None, 0))
+        self.table.builtin('wait', [])
+        self.assertEquals({}, self.table.jobs)
+        self.assertEquals(3, self.stream.getvalue().count('Done'))
+
+
+class RedirectTest(unittest.TestCase):
+    def test_restore(self):
+        stdout = sys.stdout
+        outer, inner = cStringIO.StringIO(), cStringIO.StringIO()
+
+        first = jobs.redirect('stdout', outer)
+        second = jobs.redirect('stdout', inner)
+        print 'inner'
+        jobs.restore(second)
+        print 'outer'
+        self.assertTrue(isinstance(sys.stdout, jobs.ThreadOutput))
+        jobs.restore(first)
+
+        self.assertTrue(sys.stdout is stdout)
+        self.assertEquals('inner\n', inner.getvalue())
+        self.assertEquals('outer\n', outer.getvalue())
+
+
+class ShellTest(unittest.TestCase):
+    def setUp(self):
+        argcmd.command._reset()
+        self.stream = cStringIO.StringIO()
+        self.stdout, sys.stdout = sys.stdout, self.stream
+
+        release = threading.Event()
+
+        @argcmd.command()
+        def cmd_block(args):
+            release.wait(5)
+            print 'released'
+
+        @argcmd.command()
+        def cmd_release(args):
+            release.set()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def run_shell(self, read):
+        if isinstance(read, list):
+            read = read + [EOFError()]
+
+        shell_parser, parser = argcmd._setup_parsers('prog')
+        with mock.patch('__builtin__.raw_input', side_effect=read):
+            argcmd._shell_loop(parser, jobs.JobTable(),
+                               argcmd.command._get_names())
+
+    def test_prompt(self):
+        # raw_input only uses readline if sys.stdout is the real file
+        lines = iter(['block &', 'release', 'wait'])
+        prompts = []
+        def read(prompt):
+            prompts.append(sys.stdout)
+            for line in lines:
+                return line
+            raise EOFError()
+
+        self.run_shell(read)
+        self.assertEquals([self.stream] * 4, prompts)
+        self.assertTrue(sys.stdout is self.stream)
+        self.assertEquals('[1] block\n'
+                          '[1] Done  block\n'
+                          '[1] released\n'
+                          '\n', self.stream.getvalue())
+
+
+    def test_background(self):
+        self.run_shell(['block  &', 'jobs', 'release', 'wait'])
+        self.assertEquals('[1] block\n'
+                          '[1] Running  block\n'
+                          '[1] Done  block\n'
+                          '[1] released\n'
+                          '\n', self.stream.getvalue())
+
+    def test_kill_watch(self):
+        ticked = threading.Event()
+
+        @argcmd.command()
+        def cmd_tick(args):
+            ticked.set()
+
+        def read(prompt):
+            if not lines:
+                raise EOFError()
+            if lines[0] == 'kill 1':
+                ticked.wait(5)
+            return lines.pop(0)
+
+        lines = ['--watch 0.05 tick &', 'kill 1', 'jobs']
+        self.run_shell(read)
+        self.assertEquals('[1] --watch 0.05 tick\n'
+                          '[1] Killed  --watch 0.05 tick\n'
+                          '\n', self.stream.getvalue())
+
+    @mock.patch('sys.stderr')
+    def test_stderr(self, mock_stderr):
+        @argcmd.command()
+        def cmd_fail(args):
+            sys.stderr.write('failed\n')
+            return 3
+
+        self.run_shell(['fail &', 'wait'])
+        self.assertEquals('[1] fail\n'
+                          '[1] Exit 3  fail\n'
+                          '[1] failed\n'
+                          '\n', self.stream.getvalue())
+        self.assertFalse(mock_stderr.write.called)
+
+    @mock.patch('sys.stderr')
+    def test_builtins(self, mock_stderr):
+        # registered commands take precedence over built-in commands
+        @argcmd.command()
+        def cmd_jobs(args):
+            print 'my jobs'
+
+        self.run_shell(['jobs', 'fg &', 'wait'])
+        self.assertEquals('my jobs\n\n', self.stream.getvalue())
+        mock_stderr.write.assert_called_once_with(
+            'fg: can not run in the background\n')
+
+    def test_interrupt(self):
+        # Ctrl-C cancels the command in the foreground, not the shell
+        @argcmd.command()
+        def cmd_interrupt(args):
+            raise KeyboardInterrupt()
+
+        self.run_shell(['interrupt', 'release', 'block'])
+        self.assertEquals('\nreleased\n\n', self.stream.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+import argparse
+import cStringIO
+import time
+import unittest
+
+import argcmd
+from argcmd import jobs
+from argcmd import meter
+
+
+class TTY(object):
+    def __init__(self):
+        self.buffer = cStringIO.StringIO()
+
+    def write(self, data):
+        self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return True
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+
+class ProgressTest(unittest.TestCase):
+    def test_disabled(self):
+        items = range(10)
+        stream = TTY()
+        quiet = argparse.Namespace(verbosity=0, color=False)
+        self.assertTrue(argcmd.progress(items, args=quiet,
+                                        stream=stream) is items)
+        self.assertTrue(argcmd.progress(items,
+                                        stream=cStringIO.StringIO()) is items)
+
+        # captured output is not a terminal
+        output = jobs.ThreadOutput(stream)
+        output.buffers[jobs.thread.get_ident()] = cStringIO.StringIO()
+        self.assertTrue(argcmd.progress(items, stream=output) is items)
+        self.assertEquals('', stream.getvalue())
+
+    def test_format(self):
+        m = meter.Meter([], total=200)
+        m.count = 50
+        self.assertEquals(' 25.0% 50/200 10.0/s ETA 0:00:15', m.format(5))
+        m.count = 200
+        self.assertEquals('100.0% 200/200 40.0/s 0:00:05', m.format(5))
+
+        m = meter.Meter(iter([]), color=True)
+        m.count = 90
+        self.assertEquals('90 1.0/s 0:01:30', m.format(90))
+        m.total = 100
+        self.assertTrue(m.format(90).startswith('\x1b[36m 90.0%\x1b[0m'))
+
+    def test_redraw(self):
+        # each item takes 10ms
+        now = [0.0]
+        def items():
+            for i in range(100):
+                now[0] += 0.01
+                yield i
+
+        stream = TTY()
+        m = meter.Meter(items(), 100, stream=stream, interval=0.2,
+                        clock=lambda: now[0])
+        self.assertEquals(range(100), list(m))
+
+        # redrawn by wall clock, not once per item
+        output = stream.getvalue()
+        self.assertTrue(output.endswith('\n'))
+        self.assertTrue('100.0% 100/100' in output, output)
+        self.assertTrue(2 < output.count('\r') < 20, output)
+        self.assertTrue(output.rstrip().endswith('0:00:01'), output)
+
+    def test_slow_down(self):
+        # fast items followed by slow ones still redraw every interval
+        def items():
+            for i in xrange(200000):
+                yield i
+            for i in range(5):
+                time.sleep(0.1)
+                yield i
+
+        stream = TTY()
+        for item in meter.Meter(items(), 200005, stream=stream,
+                                interval=0.05):
+            pass
+
+        counts = [int(line.split()[1].split('/')[0])
+                  for line in stream.getvalue().split('\r') if line]
+        slow = [n for n in counts if 200000 < n < 200005]
+        self.assertTrue(len(slow) >= 3, counts)
+
+    def test_overhead(self):
+        # per item cost of a drawing meter compared to a plain loop
+        items = xrange(200000)
+        def loop(iterable):
+            start = time.time()
+            for item in iterable:
+                pass
+            return time.time() - start
+
+        base = min(loop(items) for i in range(3))
+        cost = min(loop(meter.Meter(items, stream=TTY())) for i in range(3))
+        self.assertTrue((cost - base) / len(items) < 1e-6,
+                        '%.3fus per item' % ((cost - base) / len(items) * 1e6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011 Örjan Persson
+
+import unittest
+
+from argcmd import search
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = search.Index()
+        self.index.add_command('queue-stats', ['qs'],
+                               ['show queue statistics', '', 'Per host.'],
+                               [(('-H', '--host'), 'host to query')])
+        self.index.add_command('hosts', [],
+                               ['list hosts'],
+                               [(('--all',), 'include %(default)s ones')])
+        self.index.add_command('stop', ['halt'], ['stop the queue'], [])
+
+    def assert_search(self, query, expected):
+        names = [name for name, summary in self.index.search(query)]
+        self.assertEquals(expected, names)
+
+    def test_search(self):
+        self.assert_search(['queue'], ['queue-stats', 'stop'])
+        self.assert_search(['host'], ['hosts', 'queue-stats'])
+        self.assert_search(['qs'], ['queue-stats'])
+        self.assert_search(['halt'], ['stop'])
+        self.assert_search(['queue-stats'], ['queue-stats'])
+        self.assert_search(['STAT'], ['queue-stats'])
+        self.assert_search(['queue', 'stop'], ['stop'])
+        self.assert_search(['default'], [])
+        self.assert_search(['nothing'], [])
+
+    def test_summary(self):
+        self.assertEquals([('hosts', 'list hosts')],
+                          self.index.search(['list']))
+
+
+if __name__ == '__main__':
+    unittest.main()